@@ -3,6 +3,8 @@ from pathlib import Path
 import os
 
 import dotenv
+from django.core.exceptions import ImproperlyConfigured
+from boto3.s3.transfer import TransferConfig
 #dotenv.read_dotenv()
 dotenv.load_dotenv()
 
@@ -36,6 +38,7 @@ INSTALLED_APPS = [
     'django_filters',
     'storages',
     'sslserver',
+    'django_crontab',
 
     'product',
     'account',
@@ -136,6 +139,46 @@ AWS_REGION_NAME = os.environ.get('AWS_REGION_NAME')
 AWS_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_S3_VERIFY = True
+# Caps the part threads per multipart upload (boto3 defaults to 10). Image
+# uploads already run 8 files at a time, so this bounds a request to 32.
+AWS_S3_TRANSFER_CONFIG = TransferConfig(max_concurrency=4)
+
+# Public bucket or CDN origin for product images; when set, image URLs are
+# built from it instead of being signed per request.
+IMAGE_URL_BASE = os.environ.get('IMAGE_URL_BASE')
+
+
+# Cache
+# Redis when REDIS_URL is configured. The per-process local memory cache is
+# only for development and tests: cache invalidation has to reach every
+# worker, so it is refused with DEBUG off.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+elif not DEBUG:
+    raise ImproperlyConfigured('REDIS_URL must be set when DEBUG is off.')
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Scheduled jobs (django-crontab)
+
+CRONJOBS = [
+    ('0 * * * *', 'django.core.management.call_command', ['purge_idempotency_keys']),
+    ('* * * * *', 'django.core.management.call_command', ['process_stripe_events']),
+    ('*/15 * * * *', 'django.core.management.call_command', ['refresh_sales_rollups']),
+    ('* * * * *', 'django.core.management.call_command', ['generate_image_variants']),
+    ('*/5 * * * *', 'django.core.management.call_command', ['sweep_storage_deletions']),
+]
 
 
 # Password validation
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+
+
+BULK_UPDATE_CHUNK_SIZE = 1000
+
+
+def _chunks(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _apply(ids, changes):
+    # Lock the chunk's rows so the reported ids are exactly the ones updated.
+    with transaction.atomic():
+        found = list(Order.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+        Order.objects.filter(id__in=found).update(**changes, updated_at=timezone.now())
+    return found
+
+
+def update_orders_by_id(ids, changes, chunk_size=BULK_UPDATE_CHUNK_SIZE):
+    """
+    Apply `changes` to the orders in `ids`, one UPDATE per chunk. Returns the
+    (updated, missing) id lists.
+    """
+    ids = list(dict.fromkeys(ids))
+    updated = set()
+    for chunk in _chunks(ids, chunk_size):
+        updated.update(_apply(chunk, changes))
+    return [i for i in ids if i in updated], [i for i in ids if i not in updated]
+
+
+def update_orders_matching(queryset, changes, chunk_size=BULK_UPDATE_CHUNK_SIZE):
+    """
+    Apply `changes` to every order in `queryset`, walking it by id so each
+    chunk is a short transaction even when the change removes rows from the
+    filter. Returns the updated ids.
+    """
+    updated = []
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return updated
+        updated += _apply(ids, changes)
+        last_id = ids[-1]
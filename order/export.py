@@ -0,0 +1,66 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import OrderItem
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    ('order_id', 'order_id'),
+    ('created_at', 'order__created_at'),
+    ('user_id', 'order__user_id'),
+    ('order_status', 'order__order_status'),
+    ('payment_status', 'order__payment_status'),
+    ('payment_mode', 'order__payment_mode'),
+    ('total_amount', 'order__total_amount'),
+    ('city', 'order__city'),
+    ('country', 'order__country'),
+    ('item_id', 'id'),
+    ('product_id', 'product_id'),
+    ('name', 'name'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+]
+
+EXPORT_FORMATS = ['csv', 'ndjson']
+
+
+class _Echo:
+
+    def write(self, value):
+        return value
+
+
+def export_rows(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one tuple per item of the orders in `orders`, joined with its
+    order's columns. Rows are read through a server-side cursor, so memory
+    stays flat however many there are.
+    """
+    items = (
+        OrderItem.objects.filter(order__in=orders.order_by().values('id'))
+        .order_by('order_id', 'id')
+        .values_list(*[lookup for _, lookup in EXPORT_FIELDS])
+    )
+    return items.iterator(chunk_size=chunk_size)
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(orders, export_format):
+    lines = csv_lines if export_format == 'csv' else ndjson_lines
+    return lines(export_rows(orders))
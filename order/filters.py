@@ -4,6 +4,9 @@ from .models import Order
 
 class OrderFilter(filters.FilterSet):
 
+    created_after = filters.DateFilter(field_name='created_at', lookup_expr='date__gte')
+    created_before = filters.DateFilter(field_name='created_at', lookup_expr='date__lte')
+
     class Meta:
         model = Order
-        fields = ['id','order_status','payment_status','payment_mode']
\ No newline at end of file
+        fields = ['id','order_status','payment_status','payment_mode','created_after','created_before']
\ No newline at end of file
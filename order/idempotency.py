@@ -0,0 +1,89 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+class _Discard(Exception):
+
+    def __init__(self, response):
+        self.response = response
+
+
+def _request_hash(payload):
+    if payload is None:
+        return ''
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return Response({
+            'success': False,
+            'message': 'Idempotency key reused with a different request.'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def run_once(scope, key, handler, user=None, payload=None, ttl=IDEMPOTENCY_KEY_TTL):
+    """
+    Run `handler()` at most once per (scope, key) and replay its stored
+    response for repeats until the key expires.
+
+    The key row is inserted in the same transaction as the handler's writes.
+    A concurrent duplicate blocks on the unique index until the first commits
+    and then replays its result. Failed responses are not stored, so the
+    client can retry them.
+    """
+    request_hash = _request_hash(payload)
+    now = timezone.now()
+
+    record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if record is not None:
+        if record.expires_at > now:
+            return _replay(record, request_hash)
+        record.delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope, key=key, user=user, request_hash=request_hash, expires_at=now + ttl
+            )
+            response = handler()
+
+            if response.status_code >= 400 or response.data.get('success') is False:
+                raise _Discard(response)
+
+            record.status_code = response.status_code
+            record.response = json.loads(JSONRenderer().render(response.data))
+            record.save(update_fields=['status_code', 'response'])
+
+        return response
+
+    except _Discard as discarded:
+        return discarded.response
+
+    except IntegrityError:
+        return _replay(IdempotencyKey.objects.get(scope=scope, key=key), request_hash)
+
+
+def purge_expired_keys(batch_size=1000):
+    total = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
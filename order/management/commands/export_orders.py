@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from order.export import EXPORT_FORMATS, export_lines
+from order.filters import OrderFilter
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream orders and their items as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write to; defaults to stdout.')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='FIELD=VALUE',
+            help=f'OrderFilter field to filter on ({", ".join(OrderFilter.base_filters)}). Repeatable.'
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for expression in options['filter']:
+            field, sep, value = expression.partition('=')
+            if not sep or field not in OrderFilter.base_filters:
+                raise CommandError(f'Invalid filter: {expression}')
+            params[field] = value
+
+        filterset = OrderFilter(params, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        lines = export_lines(filterset.qs, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from order.models import StripeEvent, StripeEventStatus
+from order.webhooks import EVENT_BATCH_SIZE, process_due_events
+
+
+class Command(BaseCommand):
+    help = 'Process persisted Stripe webhook events, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EVENT_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop.')
+        parser.add_argument('--retry-dead', action='store_true', help='Requeue dead-lettered events before processing.')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            requeued = StripeEvent.objects.filter(status=StripeEventStatus.DEAD).update(
+                status=StripeEventStatus.PENDING, attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'Requeued {requeued} dead events.')
+
+        while True:
+            processed = process_due_events(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} events.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
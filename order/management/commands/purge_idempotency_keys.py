@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = purge_expired_keys(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired idempotency keys.'))
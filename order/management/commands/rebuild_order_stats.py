@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.stats import rebuild_order_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-user order statistics from the Order table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_order_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt order stats for {total} users.'))
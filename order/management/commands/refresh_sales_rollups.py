@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from order.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refresh the daily sales rollups from the last high-water mark.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead of refreshing from the watermark.')
+
+    def handle(self, *args, **options):
+        start = refresh_sales_rollups(full=options['full'])
+        if start is None:
+            self.stdout.write('No orders to roll up.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Refreshed sales rollups from {start}.'))
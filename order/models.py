@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from product.models import Product
 
@@ -21,7 +22,7 @@ class PaymentMode(models.TextChoices):
 class Order(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    total_amount = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     area = models.CharField(max_length=500, default='', blank=False)
     city = models.CharField(max_length=100, default='', blank=False)
@@ -37,6 +38,11 @@ class Order(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
         
     def __str__(self):
         return str(self.id)
@@ -51,4 +57,112 @@ class OrderItem(models.Model):
     image = models.CharField(max_length=500, default='', blank=False)
 
     def __str__(self):
-        return str(self.name)
\ No newline at end of file
+        return str(self.name)
+
+class IdempotencyKey(models.Model):
+
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    request_hash = models.CharField(max_length=64, default='', blank=True)
+    status_code = models.IntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key}'
+
+
+class StripeEventStatus(models.TextChoices):
+    PENDING = 'Pending'
+    PROCESSED = 'Processed'
+    DEAD = 'Dead'
+
+
+class StripeEvent(models.Model):
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=StripeEventStatus.choices, default=StripeEventStatus.PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(default='', blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='stripe_event_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.event_id
+
+
+class UserOrderStats(models.Model):
+
+    user = models.OneToOneField(User, primary_key=True, related_name='order_stats', on_delete=models.CASCADE)
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class SalesWatermark(models.Model):
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class DailyProductSales(models.Model):
+
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'product'], name='sales_product_date_idx'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+
+    date = models.DateField()
+    category = models.CharField(max_length=30)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'category'], name='sales_category_date_idx'),
+        ]
+
+
+class DailyPaymentSales(models.Model):
+
+    date = models.DateField()
+    payment_mode = models.CharField(max_length=20, choices=PaymentMode.choices)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'payment_mode'], name='sales_payment_date_idx'),
+        ]
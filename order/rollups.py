@@ -0,0 +1,78 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    DailyCategorySales, DailyPaymentSales, DailyProductSales, Order, OrderItem, SalesWatermark
+)
+
+
+SALES_WATERMARK = 'sales_rollups'
+
+# Orders are stamped when their transaction starts, so one can commit after
+# the watermark has passed its created_at. Recomputing from a little before the
+# watermark picks such orders up.
+ROLLUP_LOOKBACK = timedelta(hours=1)
+
+ROLLUP_MODELS = [DailyProductSales, DailyCategorySales, DailyPaymentSales]
+
+
+def _rollup_start(watermark):
+    if watermark is not None:
+        return (watermark - ROLLUP_LOOKBACK).date()
+
+    first = Order.objects.aggregate(first=Min('created_at'))['first']
+    return first.date() if first else None
+
+
+def refresh_sales_rollups(full=False):
+    """
+    Recompute the daily rollups for every day from the high-water mark up to
+    now and move the mark forward. Only those days' orders are read; `full`
+    rebuilds all days, which also reflects deleted or edited older orders.
+    Returns the first day recomputed, or None when there are no orders.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Serialises concurrent refreshes on the watermark row.
+        _, created = SalesWatermark.objects.get_or_create(name=SALES_WATERMARK, defaults={'value': now})
+        watermark = SalesWatermark.objects.select_for_update().get(name=SALES_WATERMARK)
+
+        start = _rollup_start(None if created or full else watermark.value)
+        for model in ROLLUP_MODELS:
+            stale = model.objects.all() if full or start is None else model.objects.filter(date__gte=start)
+            stale.delete()
+
+        if start is None:
+            SalesWatermark.objects.filter(name=SALES_WATERMARK).update(value=now)
+            return None
+
+        since = datetime.combine(start, time.min)
+        if timezone.is_aware(now):
+            since = timezone.make_aware(since)
+
+        orders = Order.objects.filter(created_at__gte=since, created_at__lt=now)
+        items = OrderItem.objects.filter(order__in=orders).annotate(date=TruncDate('order__created_at'))
+        line_total = Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+        DailyProductSales.objects.bulk_create(
+            DailyProductSales(date=row['date'], product_id=row['product'], units=row['units'], revenue=row['revenue'])
+            for row in items.order_by().values('date', 'product').annotate(units=Sum('quantity'), revenue=line_total)
+        )
+        DailyCategorySales.objects.bulk_create(
+            DailyCategorySales(date=row['date'], category=row['product__category'] or '', units=row['units'], revenue=row['revenue'])
+            for row in items.order_by().values('date', 'product__category').annotate(units=Sum('quantity'), revenue=line_total)
+        )
+        DailyPaymentSales.objects.bulk_create(
+            DailyPaymentSales(date=row['date'], payment_mode=row['order__payment_mode'], order_count=row['orders'], revenue=row['revenue'])
+            for row in items.order_by().values('date', 'order__payment_mode')
+            .annotate(orders=Count('order', distinct=True), revenue=line_total)
+        )
+
+        SalesWatermark.objects.filter(name=SALES_WATERMARK).update(value=now)
+
+    return start
@@ -17,6 +17,11 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # One query for the items of every order on the page.
+        return queryset.prefetch_related('orderItems')
+
     def get_order_items(self, obj):
         
         order_items = obj.orderItems.all()
@@ -0,0 +1,78 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Order, UserOrderStats
+
+
+def record_order(order):
+    """
+    Add `order` to its user's running stats. Call it inside the transaction
+    that creates the order.
+    """
+    if order.user_id is None:
+        return
+
+    updated = UserOrderStats.objects.filter(user_id=order.user_id).update(
+        order_count=F('order_count') + 1,
+        total_spent=F('total_spent') + order.total_amount,
+        last_order_at=Greatest(Coalesce('last_order_at', order.created_at), order.created_at)
+    )
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            UserOrderStats.objects.create(
+                user_id=order.user_id,
+                order_count=1,
+                total_spent=order.total_amount,
+                last_order_at=order.created_at
+            )
+    except IntegrityError:
+        # A concurrent first order created the row; add to it instead.
+        record_order(order)
+
+
+def remove_order(order):
+    """
+    Take a deleted `order` out of its user's stats. Call it in the same
+    transaction as the delete.
+    """
+    if order.user_id is None:
+        return
+
+    latest = Order.objects.filter(user_id=order.user_id).order_by('-created_at').values('created_at')[:1]
+    UserOrderStats.objects.filter(user_id=order.user_id).update(
+        order_count=F('order_count') - 1,
+        total_spent=F('total_spent') - order.total_amount,
+        last_order_at=Subquery(latest)
+    )
+
+
+def rebuild_order_stats(batch_size=1000):
+    rows = (
+        Order.objects.filter(user__isnull=False).order_by().values('user')
+        .annotate(order_count=Count('id'), total_spent=Sum('total_amount'), last_order_at=Max('created_at'))
+        .order_by('user')
+    )
+
+    with transaction.atomic():
+        UserOrderStats.objects.all().delete()
+
+        batch = []
+        total = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(UserOrderStats(
+                user_id=row['user'],
+                order_count=row['order_count'],
+                total_spent=row['total_spent'],
+                last_order_at=row['last_order_at']
+            ))
+            if len(batch) >= batch_size:
+                UserOrderStats.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+
+        UserOrderStats.objects.bulk_create(batch)
+        return total + len(batch)
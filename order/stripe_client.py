@@ -0,0 +1,39 @@
+import os
+import threading
+
+import stripe
+from stripe.http_client import RequestsClient
+
+
+STRIPE_TIMEOUT = 30
+STRIPE_MAX_NETWORK_RETRIES = 2
+
+_lock = threading.Lock()
+_configured = False
+
+
+def get_stripe():
+    """
+    Return the stripe module configured once per process. The shared
+    RequestsClient keeps a pooled session per worker thread, so requests
+    reuse TLS connections instead of reconnecting for every call.
+    """
+    global _configured
+
+    if not _configured:
+        with _lock:
+            if not _configured:
+                stripe.api_key = os.environ.get('STRIPE_PRIVATE_KEY')
+                stripe.api_base = os.environ.get('STRIPE_API_BASE', stripe.api_base)
+                stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+                stripe.default_http_client = RequestsClient(timeout=STRIPE_TIMEOUT)
+                _configured = True
+
+    return stripe
+
+
+def reset_stripe():
+    # Lets tests point the client at a different api_base.
+    global _configured
+    with _lock:
+        _configured = False
@@ -1,3 +1,607 @@
-from django.test import TestCase
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import IdempotencyKey, Order, OrderItem, PaymentStatus, StripeEvent, StripeEventStatus, UserOrderStats
+from .bulk import update_orders_by_id
+from .stripe_client import reset_stripe
+from .webhooks import MAX_ATTEMPTS, process_due_events
+from product.models import Product, ProductImages
+from product.stock import InsufficientStock, reserve_stock
+from product.tests import TEST_STORAGES
+
+
+SHIPPING = {
+    'area': 'MG Road',
+    'city': 'Bengaluru',
+    'state': 'Karnataka',
+    'country': 'India',
+    'zip_code': '560001',
+    'phone_no': '9999999999',
+}
+
+
+def create_products(count, stock=100):
+    products = Product.objects.bulk_create([
+        Product(name=f'Product {i}', brand='Acme', category='Home', price=10 + i, stock=stock)
+        for i in range(count)
+    ])
+    ProductImages.objects.bulk_create([
+        ProductImages(product=product, image=f'products/{product.id}.jpg') for product in products
+    ])
+    return products
+
+
+class PlaceOrderTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com', email='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        self.products = create_products(20)
+
+    def place(self, products, quantity=2):
+        items = [{'product': p.id, 'quantity': quantity} for p in products]
+        return self.client.post('/api/order/place', {**SHIPPING, 'order_items': items}, format='json')
+
+    def test_places_order_and_decrements_stock(self):
+        response = self.place(self.products[:3]).json()
+        self.assertTrue(response['success'])
+
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, (10 + 11 + 12) * 2)
+        self.assertEqual(
+            list(order.orderItems.order_by('id').values_list('image', flat=True)),
+            [f'products/{p.id}.jpg' for p in self.products[:3]]
+        )
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 98)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        # The first order also creates the user's stats row.
+        self.place(self.products[:1])
+        with CaptureQueriesContext(connection) as small:
+            self.place(self.products[:1])
+        with CaptureQueriesContext(connection) as large:
+            self.place(self.products)
+        self.assertEqual(len(small), len(large))
+
+    def test_unknown_product_writes_nothing(self):
+        missing = Product(id=999999)
+        response = self.place([self.products[0], missing]).json()
+
+        self.assertFalse(response['success'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 100)
+
+    def test_short_stock_rejects_whole_order(self):
+        Product.objects.filter(id=self.products[1].id).update(stock=1)
+        response = self.place(self.products[:3])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['shortages'], {str(self.products[1].id): 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 100)
+
+
+class StockReservationStressTest(TransactionTestCase):
+
+    THREADS = 8
+    ATTEMPTS = 10
+
+    def test_concurrent_reservations_never_oversell(self):
+        first, second = create_products(2, stock=30)
+        placed = []
+        lock = threading.Lock()
+
+        def buy(reverse):
+            # Half the workers list the cart in the opposite order to make
+            # sure lock ordering, not cart ordering, decides who waits.
+            cart = {second.id: 1, first.id: 2} if reverse else {first.id: 2, second.id: 1}
+            attempts = 0
+            try:
+                while attempts < self.ATTEMPTS:
+                    try:
+                        with transaction.atomic():
+                            reserve_stock(cart)
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting.
+                        time.sleep(0.001)
+                        continue
+                    except InsufficientStock:
+                        pass
+                    else:
+                        with lock:
+                            placed.append(cart)
+                    attempts += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(i % 2,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertGreaterEqual(first.stock, 0)
+        self.assertGreaterEqual(second.stock, 0)
+        # Demand far exceeds supply: exactly the available stock is sold and
+        # every successful reservation is reflected once.
+        self.assertEqual(len(placed), 15)
+        self.assertEqual(first.stock, 30 - 2 * len(placed))
+        self.assertEqual(second.stock, 30 - len(placed))
+
+
+class IdempotencyTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com', email='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        self.product = create_products(1)[0]
+
+    def place(self, key, quantity=1):
+        data = {**SHIPPING, 'order_items': [{'product': self.product.id, 'quantity': quantity}]}
+        return self.client.post('/api/order/place', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_order(self):
+        first = self.place('checkout-1')
+        second = self.place('checkout-1')
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 99)
+
+    def test_key_reused_with_different_body(self):
+        self.place('checkout-1')
+        self.assertEqual(self.place('checkout-1', quantity=3).status_code, 422)
+
+    def test_failed_attempts_are_not_stored(self):
+        Product.objects.filter(id=self.product.id).update(stock=0)
+        self.assertEqual(self.place('checkout-1').status_code, 409)
+
+        Product.objects.filter(id=self.product.id).update(stock=5)
+        self.assertTrue(self.place('checkout-1').json()['success'])
+
+    def test_expired_keys_are_purged(self):
+        self.place('checkout-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class StripeWebhookTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        # The order takes the last two units.
+        self.product = create_products(1, stock=2)[0]
+        items = [{'product': self.product.id, 'quantity': 2}]
+        self.order_id = self.client.post('/api/order/place', {**SHIPPING, 'order_items': items}, format='json').json()['data']['id']
+
+    def deliver(self, event_id='evt_1', session_id='cs_test_1', amount_total=2000):
+        event = {
+            'id': event_id,
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': session_id,
+                'amount_total': amount_total,
+                'metadata': {**SHIPPING, 'user': str(self.user.id), 'order_id': str(self.order_id)},
+            }},
+        }
+        with mock.patch('stripe.Webhook.construct_event', return_value=event):
+            return self.client.post(
+                '/api/order/webhook', json.dumps(event), content_type='application/json', HTTP_STRIPE_SIGNATURE='t=1'
+            )
+
+    def test_webhook_acks_without_settling(self):
+        response = self.deliver()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StripeEvent.objects.get().status, StripeEventStatus.PENDING)
+        self.assertEqual(Order.objects.get().payment_status, PaymentStatus.UNPAID)
+
+    def test_worker_settles_placed_order_once(self):
+        self.deliver()
+        self.deliver()
+        self.deliver(event_id='evt_2')
+
+        with mock.patch('stripe.checkout.Session.retrieve') as retrieve:
+            call_command('process_stripe_events', stdout=StringIO())
+
+        order = Order.objects.get()
+        self.assertEqual(order.id, self.order_id)
+        self.assertEqual((order.payment_status, order.payment_mode), (PaymentStatus.PAID, 'CARD'))
+        # Stock was reserved once, at placement.
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 0)
+        retrieve.assert_not_called()
+        self.assertEqual(StripeEvent.objects.filter(status=StripeEventStatus.PROCESSED).count(), 2)
+
+    def test_amount_mismatch_backs_off_then_dead_letters(self):
+        self.deliver(amount_total=1000)
+
+        for _ in range(MAX_ATTEMPTS):
+            StripeEvent.objects.update(next_attempt_at=timezone.now())
+            process_due_events()
+
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEventStatus.DEAD)
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+        self.assertIn('does not match', event.last_error)
+        self.assertEqual(Order.objects.get().payment_status, PaymentStatus.UNPAID)
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without NODELAY the
+        # delayed-ACK stall would dominate every measurement.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.server.last_body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        body = json.dumps({'id': 'cs_test_1', 'object': 'checkout.session', 'url': 'https://checkout.test/1'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class CheckoutSessionBenchmarkTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeStripeServer(('127.0.0.1', 0), FakeStripeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        env = mock.patch.dict(os.environ, {
+            'STRIPE_API_BASE': f'http://127.0.0.1:{self.server.server_port}',
+            'STRIPE_PRIVATE_KEY': 'sk_test_fake',
+            'NO_PROXY': '127.0.0.1',
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        reset_stripe()
+        self.addCleanup(reset_stripe)
+
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com', email='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        self.products = create_products(50)
+
+    def create_order(self, size):
+        order = Order.objects.create(user=self.user, **SHIPPING)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=p, name=p.name, price=p.price, quantity=1, image=f'products/{p.id}.jpg')
+            for p in self.products[:size]
+        ])
+        return order
+
+    def checkout(self, order):
+        return self.client.post(f'/api/order/checkout-session/{order.id}', {}, format='json')
+
+    def test_cost_does_not_grow_with_cart(self):
+        small, large = self.create_order(1), self.create_order(50)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.assertEqual(self.checkout(small).json()['session']['id'], 'cs_test_1')
+        with CaptureQueriesContext(connection) as large_queries:
+            self.checkout(large)
+        for _ in range(5):
+            self.checkout(large)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        # Every request went over one pooled keep-alive connection.
+        self.assertEqual(self.server.connections, 1)
+
+    def test_session_metadata_links_order(self):
+        order = self.create_order(2)
+        self.checkout(order)
+
+        form = parse_qs(self.server.last_body)
+        self.assertEqual(form['metadata[order_id]'], [str(order.id)])
+
+    @skipUnless(os.environ.get('BENCHMARK'), 'set BENCHMARK=1 to print checkout latencies')
+    def test_report_latency(self):
+        for size in (1, 10, 50):
+            order = self.create_order(size)
+            self.checkout(order)
+            timings = []
+            for _ in range(20):
+                start = time.perf_counter()
+                self.checkout(order)
+                timings.append(time.perf_counter() - start)
+            print(f'checkout {size:>2} items: median {statistics.median(timings) * 1000:.2f} ms', file=sys.stderr)
+
+
+class OrderHistoryTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com')
+        self.client.force_authenticate(self.user)
+        product = create_products(1)[0]
+
+        self.orders = Order.objects.bulk_create([Order(user=self.user, **SHIPPING) for _ in range(25)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, name=product.name, price=product.price)
+            for order in self.orders for _ in range(3)
+        ])
+        Order.objects.create(user=User.objects.create(username='other@example.com'), **SHIPPING)
+
+    def test_page_size_and_single_count(self):
+        # count + page + items prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/order/view', {'page_size': 20}).json()
+
+        self.assertEqual(response['count'], 25)
+        self.assertEqual(len(response['data']), 20)
+        self.assertEqual(len(response['data'][0]['order']), 3)
+
+        response = self.client.get('/api/order/view', {'page_size': 1000}).json()
+        self.assertEqual(response['results per page'], 100)
+
+    def test_cursor_walks_newest_first(self):
+        ids = []
+        params = {'pagination': 'cursor', 'page_size': 10}
+        while True:
+            response = self.client.get('/api/order/view', params).json()
+            ids += [order['id'] for order in response['data']]
+            if not response['next']:
+                break
+            params = {'cursor': response['next'], 'page_size': 10}
+
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+
+class OrderStatsTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='buyer@example.com')
+        self.admin = User.objects.create(username='admin@example.com', is_staff=True)
+        self.products = create_products(2)
+
+    def place(self):
+        self.client.force_authenticate(self.user)
+        items = [{'product': p.id, 'quantity': 1} for p in self.products]
+        return self.client.post('/api/order/place', {**SHIPPING, 'order_items': items}, format='json').json()
+
+    def stats(self):
+        self.client.force_authenticate(self.user)
+        return self.client.get('/api/order/stats').json()['data']
+
+    def test_stats_follow_placement_and_deletion(self):
+        self.assertEqual(self.stats()['order_count'], 0)
+
+        first = self.place()['data']
+        second = self.place()['data']
+        stats = self.stats()
+        self.assertEqual(stats['order_count'], 2)
+        self.assertEqual(Decimal(stats['total_spent']), 42)
+        self.assertEqual(stats['last_order_at'], second['created_at'])
+
+        self.client.force_authenticate(self.admin)
+        self.client.delete(f"/api/order/delete/{second['id']}")
+        stats = self.stats()
+        self.assertEqual(stats['order_count'], 1)
+        self.assertEqual(Decimal(stats['total_spent']), 21)
+        self.assertEqual(stats['last_order_at'], first['created_at'])
+
+    def test_fractional_prices_do_not_drift(self):
+        Product.objects.filter(id__in=[p.id for p in self.products]).update(price=Decimal('10.25'))
+
+        order = self.place()['data']
+        stats = UserOrderStats.objects.get(user=self.user)
+        self.assertEqual(Order.objects.get(id=order['id']).total_amount, Decimal('20.50'))
+        self.assertEqual(stats.total_spent, Decimal('20.50'))
+
+        self.client.force_authenticate(self.admin)
+        self.client.delete(f"/api/order/delete/{order['id']}")
+        stats.refresh_from_db()
+        self.assertEqual((stats.order_count, stats.total_spent), (0, 0))
+
+    def test_rebuild_command_backfills(self):
+        Order.objects.create(user=self.user, total_amount=50, **SHIPPING)
+        Order.objects.create(user=self.user, total_amount=25, **SHIPPING)
+
+        call_command('rebuild_order_stats', stdout=StringIO())
+        stats = UserOrderStats.objects.get(user=self.user)
+        self.assertEqual((stats.order_count, stats.total_spent), (2, 75))
+
+
+class SalesRollupTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        self.products = create_products(2)
+        Product.objects.filter(id=self.products[1].id).update(category='Food')
+        self.today = timezone.now() - timedelta(minutes=5)
+
+    def create_order(self, created_at, product, quantity, payment_mode='COD'):
+        order = Order.objects.create(total_amount=product.price * quantity, payment_mode=payment_mode, **SHIPPING)
+        OrderItem.objects.create(order=order, product=product, name=product.name, price=product.price, quantity=quantity)
+        Order.objects.filter(id=order.id).update(created_at=created_at)
+        return order
+
+    def analytics(self, **params):
+        return self.client.get('/api/order/analytics', params).json()
+
+    def test_refresh_is_incremental(self):
+        old = self.today - timedelta(days=3)
+        self.create_order(old, self.products[0], 2)
+        call_command('refresh_sales_rollups', stdout=StringIO())
+
+        # Deleting an order outside the refresh window leaves its day alone;
+        # a new order is picked up by the next run.
+        Order.objects.all().delete()
+        self.create_order(timezone.now() - timedelta(minutes=1), self.products[1], 1, payment_mode='CARD')
+        call_command('refresh_sales_rollups', stdout=StringIO())
+
+        data = self.analytics(start=(old - timedelta(days=1)).date().isoformat())['data']
+        self.assertEqual([row['revenue'] for row in data['daily']], [20, 11])
+        self.assertEqual({row['category']: row['units'] for row in data['categories']}, {'Home': 2, 'Food': 1})
+
+        call_command('refresh_sales_rollups', '--full', stdout=StringIO())
+        data = self.analytics(start=(old - timedelta(days=1)).date().isoformat())['data']
+        self.assertEqual([row['revenue'] for row in data['daily']], [11])
+
+    def test_analytics_reads_only_rollups(self):
+        for days in range(0, 365, 7):
+            self.create_order(self.today - timedelta(days=days), self.products[days % 2], 1, payment_mode=['COD', 'CARD'][days % 2])
+        call_command('refresh_sales_rollups', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.analytics(start=(self.today - timedelta(days=365)).date().isoformat(), limit=1)
+        self.assertFalse(any('"order_order"' in q['sql'] or '"order_orderitem"' in q['sql'] for q in queries))
+
+        data = response['data']
+        self.assertEqual(len(data['daily']), 53)
+        self.assertEqual(sum(row['orders'] for row in data['payment_modes']), 53)
+        self.assertEqual(data['products'], [{'product': self.products[1].id, 'name': 'Product 1', 'units': 26, 'revenue': 286}])
+
+    def test_payment_revenue_matches_item_lines(self):
+        Product.objects.filter(id__in=[p.id for p in self.products]).update(price=Decimal('10.25'))
+        order = self.create_order(self.today, Product.objects.get(id=self.products[0].id), 1, payment_mode='CARD')
+        OrderItem.objects.create(order=order, product=self.products[1], name='Product 1', price=Decimal('10.25'), quantity=2)
+        call_command('refresh_sales_rollups', stdout=StringIO())
+
+        data = self.analytics(start=self.today.date().isoformat())['data']
+        self.assertEqual(data['payment_modes'], [{'payment_mode': 'CARD', 'orders': 1, 'revenue': 30.75}])
+        self.assertEqual(sum(row['revenue'] for row in data['categories']), 30.75)
+
+    def test_invalid_date(self):
+        self.assertEqual(self.client.get('/api/order/analytics', {'start': 'soon'}).status_code, 400)
+
+
+class BulkOrderUpdateTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        self.orders = Order.objects.bulk_create([
+            Order(payment_mode='CARD' if i % 2 else 'COD', **SHIPPING) for i in range(25)
+        ])
+
+    def update(self, data):
+        return self.client.post('/api/order/update', data, format='json')
+
+    def test_reports_each_id(self):
+        ids = [order.id for order in self.orders[:12]] + [999999]
+        response = self.update({'ids': ids, 'order_status': 'Shipped'}).json()
+
+        self.assertEqual(response['updated'], ids[:12])
+        self.assertEqual(response['not_found'], [999999])
+        self.assertEqual(Order.objects.filter(order_status='Shipped').count(), 12)
+
+    def test_one_update_per_chunk(self):
+        ids = [order.id for order in self.orders[:12]]
+        with CaptureQueriesContext(connection) as queries:
+            update_orders_by_id(ids, {'order_status': 'Shipped'}, chunk_size=5)
+
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "order_order"')]
+        self.assertEqual(len(updates), 3)
+
+    def test_filter_expression(self):
+        response = self.update({'filter': {'payment_mode': 'CARD'}, 'payment_status': 'Paid'}).json()
+
+        self.assertEqual(len(response['updated']), 12)
+        self.assertEqual(set(Order.objects.filter(payment_status='Paid').values_list('payment_mode', flat=True)), {'CARD'})
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.update({'ids': [1], 'order_status': 'Lost'}).status_code, 400)
+        self.assertEqual(self.update({'order_status': 'Shipped'}).status_code, 400)
+        self.assertEqual(self.update({'filter': {'user': 1}, 'order_status': 'Shipped'}).status_code, 400)
+        self.assertFalse(Order.objects.filter(order_status='Shipped').exists())
+
+
+class OrderExportTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        product = create_products(1)[0]
+        self.orders = Order.objects.bulk_create([
+            Order(total_amount=20, order_status='Shipped' if i % 2 else 'Processing', **SHIPPING) for i in range(6)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, name=product.name, price=product.price, quantity=2)
+            for order in self.orders for _ in range(2)
+        ])
+
+    def export(self, **params):
+        return self.client.get('/api/order/export', params)
+
+    def test_streams_csv(self):
+        response = self.export(order_status='Shipped')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'created_at', 'user_id'])
+        self.assertEqual(len(lines), 1 + 6)
+        self.assertEqual({int(line.split(',')[0]) for line in lines[1:]}, {o.id for o in self.orders[1::2]})
+
+    def test_streams_ndjson(self):
+        response = self.export(output='ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0]['order_id'], self.orders[0].id)
+        self.assertEqual(rows[0]['price'], '10.00')
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.export(output='xml').status_code, 400)
+        self.assertEqual(self.export(created_after='yesterday').status_code, 400)
+
+    def test_command_writes_file(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'orders.ndjson')
+        call_command('export_orders', '--format', 'ndjson', '--filter', 'order_status=Processing', '--output', path)
+
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 6)
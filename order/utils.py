@@ -0,0 +1,19 @@
+from django.core.files.storage import default_storage
+
+from product.models import ProductImages
+
+
+def get_first_images(product_ids):
+    # One query for every product's first image, keyed by product id.
+    images = {}
+    rows = ProductImages.objects.filter(product__in=product_ids).order_by('product', 'id').values_list('product', 'image')
+    for product_id, image in rows:
+        images.setdefault(product_id, image)
+    return images
+
+
+def get_image_url(request, image):
+    # Order items keep either a storage key or, from Stripe, a full URL.
+    if image.startswith(('http://', 'https://')):
+        return image
+    return request.build_absolute_uri(default_storage.url(image))
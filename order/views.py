@@ -1,18 +1,45 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework import status
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, get_list_or_404
-from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
 import stripe.error
-from .models import Order, OrderItem
+from .models import (
+    DailyCategorySales, DailyPaymentSales, DailyProductSales, Order, OrderItem, OrderStatus, PaymentStatus,
+    SalesWatermark, StripeEvent, UserOrderStats
+)
 from .serializers import OrderSerializer, OrderItemsSerializer
 from .filters import OrderFilter
-from product.models import Product, ProductImages
-from utils.helpers import get_current_host
+from product.models import Product
+from product.cache import invalidate_product_cache
+from product.stock import reserve_stock, InsufficientStock
+from .utils import get_first_images, get_image_url
+from .stripe_client import get_stripe
+from .idempotency import run_once
+from .stats import record_order, remove_order
+from .bulk import update_orders_by_id, update_orders_matching
+from .export import EXPORT_FORMATS, export_lines
+from .rollups import SALES_WATERMARK
+from .webhooks import HANDLED_EVENTS
+from utils.helpers import get_current_host, get_bounded_int
+from utils.pagination import CursorPaginator, InvalidCursor
 import stripe
+import json
 import os
+from datetime import date, timedelta
+
+
+ORDERS_PER_PAGE = 10
+MAX_ORDERS_PER_PAGE = 100
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_TOP_PRODUCTS = 10
+MAX_ANALYTICS_TOP_PRODUCTS = 100
 
 
 class PlaceOrderView(APIView):
@@ -21,6 +48,15 @@ class PlaceOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        key = request.headers.get('Idempotency-Key')
+        if key:
+            return run_once(
+                f'order-place:{request.user.id}', key, lambda: self.place_order(request),
+                user=request.user, payload=request.data
+            )
+        return self.place_order(request)
+
+    def place_order(self, request):
         try:
             user = request.user
             data = request.data
@@ -31,40 +67,59 @@ class PlaceOrderView(APIView):
                     'success': False,
                     'error': 'No order items. Please add atleast one product.'
                 })
-            
-            total_amount = 0
+
+            if any(int(item['quantity']) <= 0 for item in order_items):
+                return Response({
+                    'success': False,
+                    'error': 'Quantity must be at least 1.'
+                })
+
+            quantities = {}
             for item in order_items:
-                product = Product.objects.get(id=item['product'])
-                quantity = item['quantity']
-
-                total_amount += product.price * quantity
-
-            order = Order.objects.create(
-                user = user,
-                area = data['area'],
-                city = data['city'],
-                state = data['state'],
-                zip_code = data['zip_code'],
-                phone_no = data['phone_no'],
-                country = data['country'],
-                total_amount = total_amount
-            )
+                product_id = int(item['product'])
+                quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'])
+            product_ids = set(quantities)
+
+            with transaction.atomic():
+                products = Product.objects.in_bulk(product_ids)
+                missing = product_ids - set(products)
+                if missing:
+                    return Response({
+                        'success': False,
+                        'error': f"Products not found: {', '.join(map(str, sorted(missing)))}."
+                    })
+
+                reserve_stock(quantities)
 
-            for i in order_items:
-                product = Product.objects.get(id=i['product'])
-                product_img = ProductImages.objects.get(id=i['product'])
-
-                item = OrderItem.objects.create(
-                    product = product,
-                    order = order,
-                    name = product.name,
-                    quantity = i['quantity'],
-                    price = product.price,
-                    image = product_img.image
+                images = get_first_images(product_ids)
+                total_amount = sum(products[int(item['product'])].price * int(item['quantity']) for item in order_items)
+
+                order = Order.objects.create(
+                    user = user,
+                    area = data['area'],
+                    city = data['city'],
+                    state = data['state'],
+                    zip_code = data['zip_code'],
+                    phone_no = data['phone_no'],
+                    country = data['country'],
+                    total_amount = total_amount
                 )
-            
-                product.stock -= item.quantity
-                product.save()
+
+                items = []
+                for item in order_items:
+                    product = products[int(item['product'])]
+                    items.append(OrderItem(
+                        product = product,
+                        order = order,
+                        name = product.name,
+                        quantity = int(item['quantity']),
+                        price = product.price,
+                        image = images.get(product.id, '')
+                    ))
+                OrderItem.objects.bulk_create(items)
+                record_order(order)
+
+                invalidate_product_cache()
 
             serializer = OrderSerializer(order, many=False)
 
@@ -73,6 +128,14 @@ class PlaceOrderView(APIView):
                 'message': 'Order placed successfully.',
                 'data': serializer.data
             })
+
+        except InsufficientStock as ex:
+            return Response({
+                'success': False,
+                'message': 'Some products are out of stock.',
+                'error': str(ex),
+                'shortages': ex.shortages
+            }, status=status.HTTP_409_CONFLICT)
         
         except Exception as ex:
             return Response({
@@ -90,11 +153,14 @@ class GetAllOrdersView(APIView):
     def get(self, request):
         try:
             user = request.user
-            filterset = OrderFilter(request.GET, queryset=Order.objects.filter(user=user).order_by('id'))
-            count = filterset.qs.count()
+            orders = OrderSerializer.setup_eager_loading(Order.objects.filter(user=user).order_by('id'))
+            filterset = OrderFilter(request.GET, queryset=orders)
+            res_per_page = get_bounded_int(request.GET, 'page_size', ORDERS_PER_PAGE, MAX_ORDERS_PER_PAGE, minimum=1)
+
+            if request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET:
+                return self.get_cursor_page(request, filterset.qs, res_per_page)
 
             page_no = request.GET.get('page', 1)
-            res_per_page = 1
             paginator = Paginator(filterset.qs, res_per_page)
 
             serializer = OrderSerializer(paginator.page(page_no), many=True)
@@ -109,10 +175,17 @@ class GetAllOrdersView(APIView):
             return Response({
                 'success': True,
                 'message': 'Orders fetched successfully.',
-                'count': count,
+                'count': paginator.count,
                 'results per page': res_per_page,
                 'data': serializer.data
             }) 
+
+        except InvalidCursor as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as ex:
             return Response({
@@ -120,6 +193,24 @@ class GetAllOrdersView(APIView):
                 'message': 'Error occured',
                 'error': str(ex)
             })
+
+    def get_cursor_page(self, request, queryset, res_per_page):
+        paginator = CursorPaginator(queryset, ['-created_at', '-id'], res_per_page)
+        page = paginator.page(request.GET.get('cursor'))
+        serializer = OrderSerializer(page, many=True)
+
+        response = {
+            'success': True,
+            'message': 'Orders fetched successfully.',
+            'results per page': res_per_page,
+            'next': page.next_cursor,
+            'previous': page.prev_cursor,
+            'data': serializer.data
+        }
+        if request.GET.get('count') == 'true':
+            response['count'] = paginator.count()
+
+        return Response(response)
     
 
 class GetOrderView(APIView):
@@ -185,6 +276,68 @@ class UpdateOrderView(APIView):
             })
     
 
+class BulkUpdateOrdersView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        data = request.data
+        changes = {}
+        errors = {}
+
+        for field, choices in (('order_status', OrderStatus), ('payment_status', PaymentStatus)):
+            if field in data:
+                if data[field] in choices.values:
+                    changes[field] = data[field]
+                else:
+                    errors[field] = f'Must be one of: {", ".join(choices.values)}.'
+
+        ids = data.get('ids')
+        filters = data.get('filter')
+
+        if not changes and not errors:
+            errors['order_status'] = 'Provide order_status and/or payment_status.'
+        if (ids is None) == (filters is None):
+            errors['ids'] = 'Provide either ids or filter.'
+        elif ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            errors['ids'] = 'Must be a list of order ids.'
+        elif filters is not None and (not isinstance(filters, dict) or not filters or set(filters) - set(OrderFilter.base_filters)):
+            errors['filter'] = f'Must be a non-empty object of: {", ".join(OrderFilter.base_filters)}.'
+
+        if filters and not errors:
+            filterset = OrderFilter(filters, queryset=Order.objects.all())
+            if not filterset.is_valid():
+                errors['filter'] = filterset.errors
+
+        if errors:
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if ids is not None:
+                updated, missing = update_orders_by_id(ids, changes)
+            else:
+                updated, missing = update_orders_matching(filterset.qs, changes), []
+
+            return Response({
+                'success': True,
+                'message': f'{len(updated)} orders updated.',
+                'updated': updated,
+                'not_found': missing
+            })
+
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': str(ex)
+            })
+    
+
 class DeleteOrderView(APIView):
 
     authentication_classes = [JWTAuthentication]
@@ -192,8 +345,10 @@ class DeleteOrderView(APIView):
 
     def delete(self, request, pk):
 
-        order = get_object_or_404(Order, id=pk)
-        order.delete()
+        with transaction.atomic():
+            order = get_object_or_404(Order.objects.select_for_update(), id=pk)
+            order.delete()
+            remove_order(order)
 
         return Response({
             'success': True,
@@ -201,6 +356,111 @@ class DeleteOrderView(APIView):
         }) 
 
 
+class OrderStatsView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        stats = UserOrderStats.objects.filter(user=request.user).first()
+
+        return Response({
+            'success': True,
+            'message': 'Order stats fetched successfully.',
+            'data': {
+                'order_count': stats.order_count if stats else 0,
+                'total_spent': stats.total_spent if stats else 0,
+                'last_order_at': stats.last_order_at if stats else None
+            }
+        })
+
+
+class SalesAnalyticsView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.now().date()
+            start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+        except ValueError as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = get_bounded_int(request.GET, 'limit', ANALYTICS_TOP_PRODUCTS, MAX_ANALYTICS_TOP_PRODUCTS, minimum=1)
+            in_range = {'date__gte': start, 'date__lte': end}
+
+            daily = (
+                DailyPaymentSales.objects.filter(**in_range).values('date')
+                .annotate(orders=Sum('order_count'), revenue=Sum('revenue')).order_by('date')
+            )
+            payment_modes = (
+                DailyPaymentSales.objects.filter(**in_range).values('payment_mode')
+                .annotate(orders=Sum('order_count'), revenue=Sum('revenue')).order_by('-revenue')
+            )
+            categories = (
+                DailyCategorySales.objects.filter(**in_range).values('category')
+                .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')
+            )
+            products = (
+                DailyProductSales.objects.filter(**in_range).values('product', 'product__name')
+                .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')[:limit]
+            )
+            watermark = SalesWatermark.objects.filter(name=SALES_WATERMARK).values_list('value', flat=True).first()
+
+            return Response({
+                'success': True,
+                'message': 'Sales analytics fetched successfully.',
+                'start': start,
+                'end': end,
+                'refreshed_at': watermark,
+                'data': {
+                    'daily': list(daily),
+                    'payment_modes': list(payment_modes),
+                    'categories': list(categories),
+                    'products': [
+                        {'product': row['product'], 'name': row['product__name'], 'units': row['units'], 'revenue': row['revenue']}
+                        for row in products
+                    ]
+                }
+            })
+
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': str(ex)
+            })
+
+
+class ExportOrdersView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        # `format` is taken by DRF's content negotiation.
+        export_format = request.GET.get('output', 'csv')
+        filterset = OrderFilter(request.GET, queryset=Order.objects.all())
+
+        if export_format not in EXPORT_FORMATS or not filterset.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Error occured',
+                'error': filterset.errors or f'output must be one of: {", ".join(EXPORT_FORMATS)}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(filterset.qs, export_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
+
 class CheckoutSessionView(APIView):
 
     authentication_classes = [JWTAuthentication]
@@ -209,10 +469,16 @@ class CheckoutSessionView(APIView):
     def post(self, request, pk):
         try:
             user = request.user
-            order_items = request.data['order_items']
-            order_data = Order.objects.get(id=pk)
+            order_data = get_object_or_404(Order, id=pk, user=user)
 
-            stripe.api_key = os.environ.get('STRIPE_PRIVATE_KEY')
+            # Names, prices and images were captured on the order's items when
+            # it was placed, so one query covers the whole cart.
+            order_items = list(order_data.orderItems.all())
+            if len(order_items) == 0:
+                return Response({
+                    'success': False,
+                    'error': 'Order has no items.'
+                })
 
             shipping_details = {
                 'area': order_data.area,
@@ -221,39 +487,35 @@ class CheckoutSessionView(APIView):
                 'country': order_data.country,
                 'zip_code': order_data.zip_code,
                 'phone_no': order_data.phone_no,
-                'user': user.id
+                'user': user.id,
+                'order_id': order_data.id
             }
 
             checkout_order_items = []
 
             for item in order_items:
-
-                product = Product.objects.get(id=item['product'])
-                product_img = ProductImages.objects.get(id=item['product'])
-                image = 'http://127.0.0.1:8000/api/' + str(product_img.image)
-                print(image)
-
                 checkout_order_items.append({
                     'price_data': {
                         'currency': 'INR',
                         'product_data': {
-                            'name': product.name,
-                            'images': [image],
-                            'metadata': {'product_id': item['product']}
+                            'name': item.name,
+                            'images': [get_image_url(request, item.image)] if item.image else [],
+                            'metadata': {'product_id': item.product_id}
                         },
-                        'unit_amount': int(product.price * 100)
+                        'unit_amount': int(item.price * 100)
                     },
-                    'quantity': item['quantity'] 
+                    'quantity': item.quantity 
                 })
 
-            session = stripe.checkout.Session.create(
+            host = get_current_host(request)
+            session = get_stripe().checkout.Session.create(
                 payment_method_types=['card'],
                 metadata=shipping_details,
                 line_items=checkout_order_items,
                 customer_email=user.email,
                 mode='payment',
-                success_url='http://127.0.0.1:8000/api/products',
-                cancel_url='http://127.0.0.1:8000/api/products'
+                success_url=os.environ.get('STRIPE_SUCCESS_URL', f'{host}api/products'),
+                cancel_url=os.environ.get('STRIPE_CANCEL_URL', f'{host}api/products')
             )
 
             return Response({
@@ -284,56 +546,26 @@ class StripeWebhookView(APIView):
             try:
                 event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
             except ValueError as ex:
-                return Response({'message': 'Invalid Payload', 'error': str(ex)})
+                return Response({'message': 'Invalid Payload', 'error': str(ex)}, status=400)
             except stripe.error.SignatureVerificationError as ex:
-                return Response({'message': 'Invalid Signature', 'error': str(ex)})
-            
-            if event['type'] == 'checkout.session.completed':
-                session = event['data']['object']
-            
-                line_items = stripe.checkout.Session.list_line_items(session['id'])
-                price = session['amount_total'] / 100
-
-                order = Order.objects.create(
-                    user = User(session.metadata.user),
-                    area = session.metadata.area,
-                    city = session.metadata.city,
-                    state = session.metadata.state,
-                    country = session.metadata.country,
-                    zip_code = session.metadata.zip_code,
-                    phone_no = session.metadata.phone_no,
-                    total_amount = price,
-                    payment_mode = 'Card',
-                    payment_status = 'PAID'
+                return Response({'message': 'Invalid Signature', 'error': str(ex)}, status=400)
+
+            # Persist and acknowledge straight away; the Stripe API calls and
+            # order writes happen in the process_stripe_events worker.
+            if event['type'] in HANDLED_EVENTS:
+                StripeEvent.objects.get_or_create(
+                    event_id=event['id'],
+                    defaults={ 'type': event['type'], 'payload': json.loads(payload) }
                 )
 
-                for item in line_items:
-                    
-                    line_product = stripe.Product.retrieve(item.price.product)
-                    product_id = line_product.metadata.product_id
-
-                    product = Product.objects.get(id=product_id)
-
-                    items = OrderItem.objects.create(
-                        product = product,
-                        order = order,
-                        name = product.name,
-                        quantity = item.quantity,
-                        price = item.price.unit_amount / 100,
-                        image = line_product.images[0]
-                    )
-
-                    product.stock -= items.quantity
-                    product.save()
-
-                return Response({
-                    'success': True,
-                    'message': 'Payment Successfull'
-                })
+            return Response({
+                'success': True,
+                'message': 'Event received.'
+            })
         
         except Exception as ex:
             return Response({
                 'success': False,
                 'message': 'Error occured.',
                 'error': str(ex)
-            })
\ No newline at end of file
+            }, status=500)
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .idempotency import run_once
+from .models import Order, PaymentMode, PaymentStatus, StripeEvent, StripeEventStatus
+
+
+HANDLED_EVENTS = ['checkout.session.completed']
+MAX_ATTEMPTS = 6
+EVENT_BATCH_SIZE = 50
+
+# Stripe keeps retrying undelivered events for up to three days.
+STRIPE_IDEMPOTENCY_TTL = timedelta(days=7)
+
+
+def retry_delay(attempts):
+    # 1, 2, 4, 8, 16 minutes between attempts.
+    return timedelta(minutes=2 ** (attempts - 1))
+
+
+def record_checkout_session(session):
+    """
+    Settle the order a completed checkout session paid for. Stock was
+    reserved when the order was placed, so payment only marks it paid.
+    """
+    try:
+        metadata = session.get('metadata') or {}
+        if not metadata.get('order_id'):
+            raise ValueError('Checkout session is not linked to an order.')
+
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(id=int(metadata['order_id']), user_id=int(metadata['user']))
+
+            # The session charged each item at its stored price in paise.
+            expected = sum(int(item.price * 100) * item.quantity for item in order.orderItems.all())
+            if session['amount_total'] != expected:
+                raise ValueError(f"Paid amount {session['amount_total']} does not match order total {expected}.")
+
+            Order.objects.filter(id=order.id).update(
+                payment_mode = PaymentMode.CARD,
+                payment_status = PaymentStatus.PAID,
+                updated_at = timezone.now()
+            )
+
+        return Response({
+            'success': True,
+            'message': 'Payment Successfull',
+            'order': order.id
+        })
+
+    except Exception as ex:
+        return Response({
+            'success': False,
+            'message': 'Error occured.',
+            'error': str(ex)
+        })
+
+
+def handle_event(event):
+    if event.type == 'checkout.session.completed':
+        session = event.payload['data']['object']
+
+        # Distinct events can describe the same session; the session id keeps
+        # it to one order.
+        response = run_once(
+            'stripe-checkout-session', session['id'], lambda: record_checkout_session(session),
+            ttl=STRIPE_IDEMPOTENCY_TTL
+        )
+        if not response.data.get('success'):
+            raise RuntimeError(response.data.get('error', 'Checkout session could not be recorded.'))
+
+
+def claim_due_events(batch_size=EVENT_BATCH_SIZE):
+    # SKIP LOCKED lets several workers drain the queue without handing the
+    # same event to two of them.
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=StripeEventStatus.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        # Push the claimed events out of reach while they are worked on; a
+        # crashed worker's events become due again after the lease.
+        StripeEvent.objects.filter(id__in=[e.id for e in events]).update(
+            next_attempt_at=timezone.now() + timedelta(minutes=5)
+        )
+    return events
+
+
+def process_event(event):
+    event.attempts += 1
+    try:
+        handle_event(event)
+    except Exception as ex:
+        event.last_error = str(ex)
+        if event.attempts >= MAX_ATTEMPTS:
+            event.status = StripeEventStatus.DEAD
+        else:
+            event.next_attempt_at = timezone.now() + retry_delay(event.attempts)
+    else:
+        event.status = StripeEventStatus.PROCESSED
+        event.processed_at = timezone.now()
+        event.last_error = ''
+
+    event.save(update_fields=['attempts', 'status', 'last_error', 'next_attempt_at', 'processed_at'])
+    return event
+
+
+def process_due_events(batch_size=EVENT_BATCH_SIZE):
+    processed = 0
+    while True:
+        events = claim_due_events(batch_size)
+        if not events:
+            return processed
+        for event in events:
+            process_event(event)
+        processed += len(events)
@@ -0,0 +1,13 @@
+from django.db import transaction
+
+from utils.cache import bump_generation
+
+
+PRODUCTS_CACHE_NAMESPACE = 'products'
+PRODUCTS_CACHE_TIMEOUT = 60 * 5
+
+
+def invalidate_product_cache():
+    # Bumping the generation orphans every cached listing at once. Deferred
+    # to commit so readers never re-cache the rows being replaced.
+    transaction.on_commit(lambda: bump_generation(PRODUCTS_CACHE_NAMESPACE))
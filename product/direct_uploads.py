@@ -0,0 +1,86 @@
+import os
+import uuid
+
+from django.db import transaction
+
+from .models import ProductImages
+from .storage_cleanup import get_image_storage, list_stored_files
+
+
+DIRECT_UPLOAD_EXPIRY = 15 * 60
+MAX_DIRECT_UPLOADS = 20
+MAX_DIRECT_UPLOAD_SIZE = 20 * 1024 * 1024
+DIRECT_UPLOAD_TYPES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'}
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def upload_prefix(product_id):
+    return f'products/uploads/{product_id}/'
+
+
+def _s3_storage():
+    storage = get_image_storage()
+    if not hasattr(storage, 'bucket'):
+        raise DirectUploadError('Direct uploads need an S3 image storage.')
+    return storage
+
+
+def create_upload_targets(product_id, content_types):
+    """
+    Return a pre-signed POST target per entry of `content_types`. Clients
+    send the file straight to storage and then confirm the returned keys.
+    """
+    if not content_types or len(content_types) > MAX_DIRECT_UPLOADS:
+        raise DirectUploadError(f'Request between 1 and {MAX_DIRECT_UPLOADS} uploads.')
+    unsupported = set(content_types) - set(DIRECT_UPLOAD_TYPES)
+    if unsupported:
+        raise DirectUploadError(f'Unsupported content types: {", ".join(sorted(map(str, unsupported)))}.')
+
+    storage = _s3_storage()
+    client = storage.connection.meta.client
+
+    targets = []
+    for content_type in content_types:
+        key = f'{upload_prefix(product_id)}{uuid.uuid4().hex}{DIRECT_UPLOAD_TYPES[content_type]}'
+        post = client.generate_presigned_post(
+            storage.bucket_name,
+            storage._normalize_name(key),
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, MAX_DIRECT_UPLOAD_SIZE]],
+            ExpiresIn=DIRECT_UPLOAD_EXPIRY,
+        )
+        targets.append({'key': key, 'url': post['url'], 'fields': post['fields']})
+    return targets
+
+
+def confirm_uploads(product, keys):
+    """
+    Register the uploaded `keys` as images of `product` with one bulk_create.
+    Keys outside the product's upload prefix, not present in storage or
+    already registered are returned as rejected instead.
+    """
+    storage = _s3_storage()
+    prefix = upload_prefix(product.id)
+    keys = list(dict.fromkeys(keys))
+
+    # One listing of the product's upload prefix instead of a HEAD per key.
+    stored = {name for name, _ in list_stored_files(storage, prefix)}
+    registered = set(ProductImages.objects.filter(image__in=keys).values_list('image', flat=True))
+
+    accepted, rejected = [], {}
+    for key in keys:
+        if not key.startswith(prefix) or os.path.splitext(key)[1] not in DIRECT_UPLOAD_TYPES.values():
+            rejected[key] = 'Not an upload key for this product.'
+        elif key not in stored:
+            rejected[key] = 'Not uploaded.'
+        elif key in registered:
+            rejected[key] = 'Already registered.'
+        else:
+            accepted.append(key)
+
+    with transaction.atomic():
+        images = ProductImages.objects.bulk_create([ProductImages(product=product, image=key) for key in accepted])
+    return images, rejected
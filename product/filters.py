@@ -1,12 +1,36 @@
 from django_filters import rest_framework as filters
 from .models import Product
+from .search import search_products
 
 class ProductFilter(filters.FilterSet):
 
-    keyword = filters.CharFilter(field_name='name', lookup_expr='icontains')
-    min_price = filters.CharFilter(field_name='price' or 0, lookup_expr='gte')
-    max_price = filters.CharFilter(field_name='price' or 100000, lookup_expr='lte')
+    keyword = filters.CharFilter(method='filter_keyword')
+    min_price = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = filters.NumberFilter(field_name='price', lookup_expr='lte')
 
     class Meta:
         model = Product
-        fields = ['keyword','category','brand','min_price','max_price']
\ No newline at end of file
+        fields = ['keyword','category','brand','min_price','max_price']
+
+    def filter_keyword(self, queryset, name, value):
+        return search_products(queryset, value)
+
+
+def filter_products(params, exclude=()):
+    """
+    Apply the `search` parameter and ProductFilter to the catalog. Parameters
+    named in `exclude` are ignored, which is how facets count the options of
+    a dimension without the dimension's own filter.
+    """
+    if exclude:
+        params = params.copy()
+        for name in exclude:
+            params.pop(name, None)
+
+    products = Product.objects.order_by('id')
+    search_query = params.get('search')
+
+    if search_query:
+        products = search_products(products, search_query)
+
+    return ProductFilter(params, queryset=products).qs
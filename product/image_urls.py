@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import serializers
+
+from .storage_cleanup import get_image_storage
+
+
+IMAGE_URL_CACHE_SIZE = 10000
+
+_urls = OrderedDict()
+_lock = threading.Lock()
+
+
+def url_lifetime(storage):
+    """
+    Seconds a URL from `storage` may be reused, or None when its URLs do not
+    expire. Signed URLs are kept for half their signature lifetime, so every
+    URL handed out stays valid for at least that long.
+    """
+    if getattr(storage, 'querystring_auth', False):
+        return storage.querystring_expire // 2
+    return None
+
+
+def image_url(name):
+    """
+    URL of the stored file `name`. With IMAGE_URL_BASE set (a public bucket or
+    CDN mapped to the storage root) the URL is built without signing;
+    otherwise the storage's URL is cached per key in this process.
+    """
+    base = settings.IMAGE_URL_BASE
+    if base:
+        return f'{base.rstrip("/")}/{quote(name)}'
+
+    now = time.monotonic()
+    with _lock:
+        cached = _urls.get(name)
+        if cached is not None and (cached[0] is None or cached[0] > now):
+            _urls.move_to_end(name)
+            return cached[1]
+
+    storage = get_image_storage()
+    url = storage.url(name)
+    lifetime = url_lifetime(storage)
+
+    with _lock:
+        _urls[name] = (None if lifetime is None else now + lifetime, url)
+        _urls.move_to_end(name)
+        while len(_urls) > IMAGE_URL_CACHE_SIZE:
+            _urls.popitem(last=False)
+    return url
+
+
+@receiver(setting_changed)
+def clear_image_urls(setting, **kwargs):
+    if setting in ('STORAGES', 'DEFAULT_FILE_STORAGE', 'IMAGE_URL_BASE'):
+        with _lock:
+            _urls.clear()
+
+
+class ImageURLField(serializers.ImageField):
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        url = image_url(value.name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from product.models import ProductImages, VariantStatus
+from product.variants import VARIANT_BATCH_SIZE, process_pending_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail/medium JPEG and WebP variants for pending product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=VARIANT_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when nothing is pending.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop.')
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed images again before processing.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = ProductImages.objects.filter(variants_status=VariantStatus.FAILED).update(
+                variants_status=VariantStatus.PENDING
+            )
+            self.stdout.write(f'Requeued {requeued} failed images.')
+
+        while True:
+            handled = process_pending_variants(options['batch_size'])
+            if handled:
+                self.stdout.write(f'Processed {handled} images.')
+            if handled < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
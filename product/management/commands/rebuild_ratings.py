@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute review_count, rating_sum and ratings on every product from ProductReview.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Product.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        total = 0
+
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            total += rebuild_rating_aggregates(Product.objects.filter(id__in=batch))
+            last_id = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {total} products.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index, e.g. after bulk imports that skip save().'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Product.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        total = 0
+
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            index_products(batch)
+            last_id = batch[-1]
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} products.'))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product.models import StorageDeletion
+from product.storage_cleanup import find_orphaned_files
+
+
+class Command(BaseCommand):
+    help = 'Find product image files in storage that no ProductImages row references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='products')
+        parser.add_argument('--min-age-hours', type=float, default=24, help='Ignore files newer than this.')
+        parser.add_argument('--delete', action='store_true', help='Queue the orphans for the storage sweeper.')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(hours=options['min_age_hours'])
+        orphans = find_orphaned_files(options['prefix'], older_than)
+
+        for name in orphans:
+            self.stdout.write(name)
+
+        if options['delete']:
+            StorageDeletion.objects.bulk_create([StorageDeletion(key=name) for name in orphans], batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(orphans)} orphaned files for deletion.'))
+        else:
+            self.stdout.write(f'Found {len(orphans)} orphaned files.')
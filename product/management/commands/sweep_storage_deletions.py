@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from product.storage_cleanup import DELETE_BATCH_SIZE, sweep_deleted_files
+
+
+class Command(BaseCommand):
+    help = 'Delete queued product image files from storage in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DELETE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        removed = sweep_deleted_files(options['batch_size'])
+        self.stdout.write(f'Removed {removed} files.')
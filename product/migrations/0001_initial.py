@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='', max_length=100)),
+                ('description', models.TextField(default='', max_length=1000)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('brand', models.CharField(default='', max_length=100)),
+                ('category', models.CharField(choices=[('Electronics', 'Electronics'), ('Arts', 'Arts'), ('Clothes', 'Clothes'), ('Foot Wears', 'Foot Wears'), ('Home', 'Home'), ('Food', 'Food'), ('Cosmetics', 'Cosmetics'), ('Kitchen', 'Kitchen')], max_length=30)),
+                ('ratings', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('stock', models.IntegerField(default=0)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('updatedAt', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductImages',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='products')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='product.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.DecimalField(decimal_places=1, default=0, max_digits=2)),
+                ('review', models.TextField()),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='product.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:55
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    ProductReview = apps.get_model('product', 'ProductReview')
+
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+            Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=1)
+        ),
+        ratings=Coalesce(
+            Subquery(reviews.annotate(average=Avg('rating')).values('average')),
+            Value(0),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'createdAt', 'id'], name='review_product_created_idx'),
+        ),
+    ]
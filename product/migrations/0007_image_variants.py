@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimages',
+            name='medium',
+            field=models.ImageField(blank=True, upload_to='products/variants'),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='medium_webp',
+            field=models.ImageField(blank=True, upload_to='products/variants'),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='products/variants'),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='thumbnail_webp',
+            field=models.ImageField(blank=True, upload_to='products/variants'),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='variants_status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Ready', 'Ready'), ('Failed', 'Failed')], default='Pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='productimages',
+            index=models.Index(fields=['variants_status', 'id'], name='image_variants_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_storage_deletion_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimages',
+            name='variants_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
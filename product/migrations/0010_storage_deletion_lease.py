@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_image_variants_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagedeletion',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
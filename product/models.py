@@ -1,5 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from .search import index_products, unindex_products
 
 
 class Category(models.TextChoices):
@@ -22,20 +27,72 @@ class Product(models.Model):
     brand = models.CharField(max_length=100, default="", blank=False)
     category = models.CharField(max_length=30, choices=Category.choices)
     ratings = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
     stock = models.IntegerField(default=0)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     createdAt = models.DateTimeField(auto_now_add=True)
     updatedAt = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['createdAt', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'createdAt', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['brand', 'price', 'id'], name='product_brand_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    index_products([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def remove_search_index(sender, instance, **kwargs):
+    unindex_products([instance.id])
     
 
+class VariantStatus(models.TextChoices):
+    PENDING = 'Pending'
+    READY = 'Ready'
+    FAILED = 'Failed'
+
+
 class ProductImages(models.Model):
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, related_name='images')
     image = models.ImageField(upload_to='products')
 
+    thumbnail = models.ImageField(upload_to='products/variants', blank=True)
+    thumbnail_webp = models.ImageField(upload_to='products/variants', blank=True)
+    medium = models.ImageField(upload_to='products/variants', blank=True)
+    medium_webp = models.ImageField(upload_to='products/variants', blank=True)
+    variants_status = models.CharField(max_length=20, choices=VariantStatus.choices, default=VariantStatus.PENDING)
+    variants_leased_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['variants_status', 'id'], name='image_variants_status_idx'),
+        ]
+
+
+class StorageDeletion(models.Model):
+
+    key = models.CharField(max_length=500)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    leased_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
 
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -44,5 +101,10 @@ class ProductReview(models.Model):
     review = models.TextField(blank=False)
     createdAt = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'createdAt', 'id'], name='review_product_created_idx'),
+        ]
+
     def __str__(self):
         return self.review
\ No newline at end of file
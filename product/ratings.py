@@ -0,0 +1,52 @@
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+
+def _average(rating_sum, review_count):
+    # The float cast keeps SQLite from doing integer division; the column
+    # type rounds the result back to two decimals.
+    return Coalesce(
+        ExpressionWrapper(
+            Cast(rating_sum, FloatField()) / NullIf(review_count, 0),
+            output_field=DecimalField(max_digits=3, decimal_places=2)
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=3, decimal_places=2)
+    )
+
+
+def update_rating_aggregates(product_id, count_delta, sum_delta):
+    """
+    Apply a review insert/update/delete to the product's running totals in a
+    single UPDATE. Call it inside the transaction that writes the review.
+    """
+    from .models import Product
+
+    review_count = F('review_count') + count_delta
+    rating_sum = F('rating_sum') + sum_delta
+
+    Product.objects.filter(id=product_id).update(
+        review_count=review_count,
+        rating_sum=rating_sum,
+        ratings=_average(rating_sum, review_count),
+        updatedAt=timezone.now()
+    )
+
+
+def rebuild_rating_aggregates(products):
+    from .models import ProductReview
+
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    review_count = Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0)
+    rating_sum = Coalesce(
+        Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=1)
+    )
+
+    return products.update(
+        review_count=review_count,
+        rating_sum=rating_sum,
+        ratings=_average(rating_sum, review_count)
+    )
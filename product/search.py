@@ -0,0 +1,77 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_CONFIG = 'english'
+SQLITE_SEARCH_TABLE = 'product_search'
+
+# name matches weigh more than brand, brand more than description.
+SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+    SearchVector('brand', weight='B', config=SEARCH_CONFIG) +
+    SearchVector('description', weight='C', config=SEARCH_CONFIG)
+)
+
+
+def _sqlite_match_expression(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax.
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_products(product_ids):
+    from .models import Product
+
+    if connection.vendor == 'postgresql':
+        Product.objects.filter(id__in=product_ids).update(search_vector=SEARCH_VECTOR)
+
+    elif connection.vendor == 'sqlite':
+        rows = Product.objects.filter(id__in=product_ids).values_list('id', 'name', 'brand', 'description')
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = %s', [(i,) for i in product_ids])
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, name, brand, description) VALUES (%s, %s, %s, %s)',
+                list(rows)
+            )
+
+
+def unindex_products(product_ids):
+    # The postgres vector lives on the product row and goes away with it.
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = %s', [(i,) for i in product_ids])
+
+
+def search_products(queryset, query):
+    """
+    Filter `queryset` to products matching `query` on name, brand and
+    description, annotated with `search_rank` and ordered best match first.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', 'id')
+
+    if connection.vendor == 'sqlite':
+        expression = _sqlite_match_expression(query)
+        if not expression:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        matches = RawSQL(f'SELECT rowid FROM {SQLITE_SEARCH_TABLE} WHERE {SQLITE_SEARCH_TABLE} MATCH %s', (expression,))
+        # bm25() is lower-is-better, negate it so higher ranks sort first.
+        rank = RawSQL(
+            f'SELECT -bm25({SQLITE_SEARCH_TABLE}, 10.0, 4.0, 1.0) FROM {SQLITE_SEARCH_TABLE} '
+            f'WHERE {SQLITE_SEARCH_TABLE} MATCH %s AND rowid = {table}.id',
+            (expression,)
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    return queryset.filter(
+        Q(name__icontains=query) | Q(brand__icontains=query) | Q(description__icontains=query)
+    ).order_by('id')
@@ -1,12 +1,30 @@
+from django.db import models
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Product, ProductImages, ProductReview
+from .image_urls import ImageURLField
+from .variants import variant_url
+
+
+EMBEDDED_REVIEWS = 3
+MAX_EMBEDDED_REVIEWS = 20
+NESTED_FIELDS = ['images', 'thumbnail', 'reviews']
 
 
 class ProductImagesSerializer(serializers.ModelSerializer):
 
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, models.ImageField: ImageURLField}
+
+    url = serializers.SerializerMethodField(method_name='get_url', read_only=True)
+
     class Meta:
         model = ProductImages
-        fields = '__all__'
+        fields = ['id','product','image','thumbnail','thumbnail_webp','medium','medium_webp','variants_status','url']
+        read_only_fields = ['thumbnail', 'thumbnail_webp', 'medium', 'medium_webp', 'variants_status']
+
+    def get_url(self, obj):
+        # `image_size` and `image_format` in the context pick the variant.
+        return variant_url(obj, self.context.get('image_size', 'original'), self.context.get('image_format'))
 
 
 class ProductReviewSerializer(serializers.ModelSerializer):
@@ -19,11 +37,13 @@ class ProductReviewSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
 
     images = ProductImagesSerializer(many=True, read_only=True)
+    thumbnail = serializers.SerializerMethodField(method_name='get_thumbnail', read_only=True)
     reviews = serializers.SerializerMethodField(method_name='get_reviews', read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id','name','brand','category','description','price','stock','ratings','user','images','reviews']
+        fields = ['id','name','brand','category','description','price','stock','ratings','review_count','user','thumbnail','images','reviews']
+        read_only_fields = ['ratings','review_count']
         extra_kwargs = {
             'name': { 'required': True },
             'brand': { 'required': True },
@@ -31,8 +51,74 @@ class ProductSerializer(serializers.ModelSerializer):
             'price': { 'required': True }
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Sparse fieldsets: `fields` in the context limits the output.
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, fields=None, expand=None):
+        """
+        Resolve `fields=` and `expand=` query values into the set of output
+        fields, or None for the full representation.
+        """
+        if not fields and not expand:
+            return None
+
+        # Without `fields`, `expand` picks nested relations on top of the
+        # scalar columns.
+        requested = set(fields) if fields else set(cls.Meta.fields) - set(NESTED_FIELDS)
+        requested |= set(expand or [])
+        requested.add('id')
+        return requested & set(cls.Meta.fields)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, review_limit=EMBEDDED_REVIEWS, ordering=()):
+        """
+        Load only what the requested `fields` need: the columns they read
+        (plus any `ordering` columns) and a batched query per nested relation.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        if fields is not None:
+            columns = {'id'} | {field.lstrip('-') for field in ordering}
+            columns |= {name for name in fields if name not in NESTED_FIELDS}
+            queryset = queryset.only(*columns)
+
+        prefetches = []
+        if wanted('images'):
+            prefetches.append('images')
+        elif wanted('thumbnail'):
+            first = ProductImages.objects.order_by('id')[:1]
+            prefetches.append(Prefetch('images', queryset=first, to_attr='thumbnail_images'))
+
+        if wanted('reviews') and review_limit:
+            recent = ProductReview.objects.order_by('-createdAt', '-id')[:review_limit]
+            prefetches.append(Prefetch('reviews', queryset=recent, to_attr='recent_reviews'))
+
+        return queryset.prefetch_related(*prefetches)
+
+    def get_thumbnail(self, obj):
+        images = getattr(obj, 'thumbnail_images', None)
+        if images is None:
+            images = sorted(obj.images.all(), key=lambda image: image.id)[:1]
+        return variant_url(images[0], 'thumbnail', self.context.get('image_format')) if images else None
+
     def get_reviews(self, obj):
-        reviews = obj.reviews.all()
+        # Only the most recent reviews are embedded; ratings and review_count
+        # summarise the rest and the full list is paged at product/<id>/reviews.
+        review_limit = self.context.get('review_limit', EMBEDDED_REVIEWS)
+        if not review_limit:
+            return []
+
+        reviews = getattr(obj, 'recent_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.order_by('-createdAt', '-id')[:review_limit]
+
         serializer = ProductReviewSerializer(reviews, many=True)
         return serializer.data
-
@@ -0,0 +1,37 @@
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+
+class InsufficientStock(Exception):
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        ids = ', '.join(str(product_id) for product_id in sorted(shortages))
+        super().__init__(f'Insufficient stock for products: {ids}.')
+
+
+def reserve_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} or raise InsufficientStock
+    without changing anything. Must be called inside transaction.atomic().
+    """
+    from .models import Product
+
+    ids = sorted(quantities)
+
+    # Lock the rows in id order so concurrent multi-item carts always queue
+    # behind each other instead of deadlocking.
+    stock = dict(Product.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', 'stock'))
+    shortages = { i: quantities[i] - stock.get(i, 0) for i in ids if stock.get(i, 0) < quantities[i] }
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    # The stock >= quantity guard still holds where SELECT ... FOR UPDATE is
+    # a no-op (SQLite), so stock can never go negative.
+    quantity = Case(*[When(id=i, then=Value(quantities[i])) for i in ids], output_field=IntegerField())
+    updated = Product.objects.filter(id__in=ids, stock__gte=quantity).update(
+        stock=F('stock') - quantity,
+        updatedAt=timezone.now()
+    )
+    if updated != len(ids):
+        raise InsufficientStock({ i: quantities[i] for i in ids })
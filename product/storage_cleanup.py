@@ -0,0 +1,153 @@
+import posixpath
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ProductImages, StorageDeletion
+
+
+IMAGE_FILE_FIELDS = ['image', 'thumbnail', 'thumbnail_webp', 'medium', 'medium_webp']
+
+# S3's DeleteObjects accepts at most 1000 keys per request.
+DELETE_BATCH_SIZE = 1000
+DELETE_LEASE = timedelta(minutes=10)
+
+
+def get_image_storage():
+    return ProductImages._meta.get_field('image').storage
+
+
+def _order_item_images():
+    # Order items keep the storage key of their product's first image, so
+    # past orders still show it after the product is gone.
+    from order.models import OrderItem
+    return OrderItem.objects.exclude(image='')
+
+
+def delete_images(images):
+    """
+    Delete the `images` rows with one DELETE and queue their files, including
+    variants, for the storage sweeper. Files order items still use are kept.
+    Call it inside the caller's transaction so the queue only holds keys of
+    rows that are really gone.
+    """
+    keys = [key for row in images.values_list(*IMAGE_FILE_FIELDS) for key in row if key]
+    kept = set(_order_item_images().filter(image__in=keys).values_list('image', flat=True))
+    keys = [key for key in keys if key not in kept]
+    StorageDeletion.objects.bulk_create([StorageDeletion(key=key) for key in keys])
+    images.delete()
+    return len(keys)
+
+
+def delete_keys(storage, keys):
+    """
+    Remove `keys` from `storage` and return {key: error} for those that could
+    not be removed. S3 storages delete the whole batch in one request.
+    """
+    if hasattr(storage, 'bucket'):
+        response = storage.bucket.delete_objects(Delete={
+            'Objects': [{'Key': storage._normalize_name(key)} for key in keys],
+            'Quiet': True,
+        })
+        by_name = {storage._normalize_name(key): key for key in keys}
+        return {by_name.get(e['Key'], e['Key']): e.get('Message', e.get('Code', '')) for e in response.get('Errors', [])}
+
+    errors = {}
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception as ex:
+            errors[key] = str(ex)
+    return errors
+
+
+def claim_deletions(batch_size=DELETE_BATCH_SIZE, after=0):
+    # Same claim as the variants worker: SKIP LOCKED during the claim, then a
+    # lease that keeps other sweepers off the keys while storage is called
+    # with no transaction open.
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            StorageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(id__gt=after)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        StorageDeletion.objects.filter(id__in=[item.id for item in batch]).update(leased_until=now + DELETE_LEASE)
+    return batch
+
+
+def sweep_deleted_files(batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete queued storage keys in batches of up to `batch_size`. Each batch is
+    claimed with a lease, deleted from storage outside any transaction and
+    recorded in a second short one. Failed keys stay queued with their error
+    for the next run. Returns the number of keys removed.
+    """
+    storage = get_image_storage()
+    batch_size = min(batch_size, DELETE_BATCH_SIZE)
+    removed = 0
+    last_id = 0
+
+    while True:
+        batch = claim_deletions(batch_size, after=last_id)
+        if not batch:
+            return removed
+
+        errors = delete_keys(storage, list({item.key for item in batch}))
+        failed = [item for item in batch if item.key in errors]
+
+        with transaction.atomic():
+            StorageDeletion.objects.filter(id__in=[item.id for item in batch if item.key not in errors]).delete()
+            for item in failed:
+                StorageDeletion.objects.filter(id=item.id).update(
+                    attempts=F('attempts') + 1, last_error=errors[item.key], leased_until=None
+                )
+
+        removed += len(batch) - len(failed)
+        last_id = batch[-1].id
+
+
+def list_stored_files(storage, prefix):
+    """
+    Yield (name, last_modified) for every file under `prefix`. S3 storages
+    list the bucket directly, which includes modification times.
+    """
+    if hasattr(storage, 'bucket'):
+        location = storage._normalize_name(prefix).rstrip('/') + '/'
+        strip = len(storage._normalize_name('').rstrip('/'))
+        for summary in storage.bucket.objects.filter(Prefix=location):
+            yield summary.key[strip:].lstrip('/'), summary.last_modified
+        return
+
+    directories, files = storage.listdir(prefix)
+    for name in files:
+        path = posixpath.join(prefix, name)
+        yield path, storage.get_modified_time(path)
+    for directory in directories:
+        yield from list_stored_files(storage, posixpath.join(prefix, directory))
+
+
+def find_orphaned_files(prefix, older_than):
+    """
+    Return stored files under `prefix` last modified before `older_than` that
+    no ProductImages or OrderItem row references and that are not already
+    queued. Younger files are skipped: uploads are stored before their rows
+    are created.
+    """
+    storage = get_image_storage()
+    referenced = {key for row in ProductImages.objects.values_list(*IMAGE_FILE_FIELDS).iterator() for key in row if key}
+    referenced.update(StorageDeletion.objects.values_list('key', flat=True))
+    referenced.update(_order_item_images().values_list('image', flat=True).distinct().iterator())
+
+    older_than = _aware(older_than)
+    return [
+        name for name, modified in list_stored_files(storage, prefix)
+        if name not in referenced and _aware(modified) < older_than
+    ]
+
+
+def _aware(value):
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
@@ -1,3 +1,851 @@
-from django.test import TestCase
+import os
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
 
-# Create your tests here.
+import requests
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from storages.backends.s3 import S3Storage
+
+from .cache import invalidate_product_cache
+from .filters import ProductFilter
+from .image_urls import clear_image_urls, image_url, url_lifetime
+from .models import Product, ProductImages, ProductReview, StorageDeletion
+from .storage_cleanup import claim_deletions, sweep_deleted_files
+from .variants import claim_pending_images, process_pending_variants, variant_url
+from order.models import Order, OrderItem
+from utils.cache import get_or_build
+
+
+def create_products(count, user=None, **kwargs):
+    return Product.objects.bulk_create([
+        Product(
+            name=f'Product {i}',
+            description=f'Description {i}',
+            price=100 + i,
+            brand='Acme',
+            category='Electronics',
+            stock=10,
+            user=user,
+            **kwargs
+        )
+        for i in range(count)
+    ])
+
+
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductsViewQueryTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username='reviewer@example.com', email='reviewer@example.com')
+        self.products = create_products(12, user=self.user)
+
+        images, reviews = [], []
+        for product in self.products:
+            images += [ProductImages(product=product, image=f'products/{product.id}-{n}.jpg') for n in range(3)]
+            reviews.append(ProductReview(product=product, user=self.user, rating=4, review='Good'))
+        ProductImages.objects.bulk_create(images)
+        ProductReview.objects.bulk_create(reviews)
+
+    def test_listing_query_count_is_constant(self):
+        # count + page + images prefetch + reviews prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/products')
+
+        data = response.json()['data']
+        self.assertEqual(len(data), 5)
+        self.assertEqual(len(data[0]['images']), 3)
+        self.assertEqual(len(data[0]['reviews']), 1)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductsCursorPaginationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = create_products(12)
+
+    def walk(self, ordering):
+        ids, cursors = [], []
+        response = self.client.get('/api/products', {'pagination': 'cursor', 'ordering': ordering}).json()
+        while True:
+            ids += [p['id'] for p in response['data']]
+            if not response['next']:
+                return ids, cursors, response
+            cursors.append(response['next'])
+            response = self.client.get('/api/products', {'cursor': response['next'], 'ordering': ordering}).json()
+
+    def test_walks_every_product_once(self):
+        ids, cursors, _ = self.walk('id')
+        self.assertEqual(ids, sorted(p.id for p in self.products))
+        self.assertEqual(len(cursors), 2)
+
+    def test_descending_price_ordering(self):
+        ids, _, _ = self.walk('-price')
+        expected = [p.id for p in sorted(self.products, key=lambda p: (-p.price, p.id))]
+        self.assertEqual(ids, expected)
+
+    def test_page_mode_applies_ordering(self):
+        data = self.client.get('/api/products', {'ordering': '-price', 'page': 1}).json()['data']
+        expected = [p.id for p in sorted(self.products, key=lambda p: (-p.price, p.id))][:5]
+        self.assertEqual([p['id'] for p in data], expected)
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get('/api/products', {'pagination': 'cursor'}).json()
+        second = self.client.get('/api/products', {'cursor': first['next']}).json()
+        self.assertIsNone(first['previous'])
+
+        back = self.client.get('/api/products', {'cursor': second['previous']}).json()
+        self.assertEqual([p['id'] for p in back['data']], [p['id'] for p in first['data']])
+        self.assertIsNone(back['previous'])
+
+    def test_count_only_when_requested(self):
+        # page + images prefetch + reviews prefetch, no COUNT(*)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products', {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', response)
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in queries))
+
+        # A deeper page costs the same, with no aggregate over the catalog.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products', {'cursor': response['next']})
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('COUNT(' in q['sql'].upper() or 'MAX(' in q['sql'].upper() for q in queries))
+
+        response = self.client.get('/api/products', {'pagination': 'cursor', 'count': 'true'}).json()
+        self.assertEqual(response['count'], 12)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.phone = Product.objects.create(
+            name='Galaxy Phone', brand='Samsung', category='Electronics', price=500,
+            description='A phone with a great camera.'
+        )
+        self.case = Product.objects.create(
+            name='Leather Case', brand='Spigen', category='Electronics', price=20,
+            description='Protective case for the Galaxy phone.'
+        )
+        self.shoe = Product.objects.create(
+            name='Runner', brand='Nike', category='Foot Wears', price=80,
+            description='Lightweight running shoe.'
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/products', params).json()
+        return [p['id'] for p in response['data']]
+
+    def test_searches_name_brand_and_description(self):
+        self.assertEqual(self.search(search='nike'), [self.shoe.id])
+        self.assertEqual(self.search(search='running'), [self.shoe.id])
+        self.assertEqual(self.search(keyword='protective'), [self.case.id])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search(search='galaxy'), [self.phone.id, self.case.id])
+
+    def test_index_follows_writes(self):
+        self.shoe.name = 'Trail Blazer'
+        self.shoe.save()
+        self.assertEqual(self.search(search='blazer'), [self.shoe.id])
+
+        self.shoe.delete()
+        self.assertEqual(self.search(search='nike'), [])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductsCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create(username='admin@example.com', is_staff=True)
+        self.product = Product.objects.create(
+            name='Desk Lamp', brand='Ikea', category='Home', price=30, user=self.admin
+        )
+
+    def test_listing_is_served_from_cache(self):
+        first = self.client.get('/api/products', {'page': 1, 'category': 'Home'}).json()
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products', {'category': 'Home', 'page': '1'}).json()
+        self.assertEqual(first, second)
+
+    def test_writes_invalidate_listing(self):
+        self.client.get('/api/products')
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/product/update/{self.product.id}', {'name': 'Floor Lamp'})
+
+        data = self.client.get('/api/products').json()['data']
+        self.assertEqual(data[0]['name'], 'Floor Lamp')
+
+    def test_only_one_caller_rebuilds_expired_key(self):
+        # An entry past its soft expiry, with another worker holding the lock.
+        cache.set('stampede', (0, 'old'))
+        cache.add('stampede:lock', 1)
+        self.assertEqual(get_or_build('stampede', lambda: 'new', timeout=60), 'old')
+
+        cache.delete('stampede:lock')
+        self.assertEqual(get_or_build('stampede', lambda: 'new', timeout=60), 'new')
+
+
+class ProductRatingsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Kettle', brand='Philips', category='Kitchen', price=40)
+        self.alice = User.objects.create(username='alice@example.com')
+        self.bob = User.objects.create(username='bob@example.com')
+
+    def review(self, user, rating):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/product/review/{self.product.id}', {'rating': rating, 'review': 'Ok'}, format='json')
+
+    def assertAggregates(self, count, total, average):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, count)
+        self.assertEqual(self.product.rating_sum, Decimal(total))
+        self.assertEqual(self.product.ratings, Decimal(average))
+
+    def test_review_writes_maintain_aggregates(self):
+        self.assertTrue(self.review(self.alice, 4).json()['success'])
+        self.review(self.bob, 5)
+        self.assertAggregates(2, '9', '4.5')
+
+        self.assertEqual(self.review(self.alice, 2).json()['message'], 'Review updated successfully.')
+        self.assertAggregates(2, '7', '3.5')
+
+        self.client.force_authenticate(self.bob)
+        self.client.delete(f'/api/product/review/delete/{self.product.id}')
+        self.assertAggregates(1, '2', '2')
+
+    def test_ratings_are_rounded_before_aggregating(self):
+        self.review(self.alice, '4.55')
+        self.review(self.alice, '4.5')
+
+        self.assertEqual(ProductReview.objects.get().rating, Decimal('4.5'))
+        self.assertAggregates(1, '4.5', '4.5')
+
+    def test_non_numeric_rating(self):
+        for rating in ('great', 'NaN'):
+            self.assertEqual(self.review(self.alice, rating).status_code, 400)
+        self.assertFalse(ProductReview.objects.exists())
+
+        self.client.force_authenticate(self.alice)
+        self.client.delete(f'/api/product/review/delete/{self.product.id}')
+        self.assertAggregates(0, '0', '0')
+
+    def test_rebuild_command_repairs_drift(self):
+        ProductReview.objects.create(product=self.product, user=self.alice, rating=3, review='Ok')
+        ProductReview.objects.create(product=self.product, user=self.bob, rating=4, review='Ok')
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertAggregates(2, '7', '3.5')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductReviewsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Blender', brand='Bosch', category='Kitchen', price=60)
+        users = User.objects.bulk_create([User(username=f'user{i}@example.com') for i in range(7)])
+        self.reviews = ProductReview.objects.bulk_create([
+            ProductReview(product=self.product, user=user, rating=rating, review=f'Review {i}')
+            for i, (user, rating) in enumerate(zip(users, [5, 5, 4, 3.5, 1, 5, 2]))
+        ])
+
+    def test_listing_embeds_capped_recent_reviews(self):
+        data = self.client.get('/api/products').json()['data']
+        self.assertEqual([r['id'] for r in data[0]['reviews']], [r.id for r in self.reviews[::-1][:3]])
+
+        data = self.client.get('/api/products', {'reviews': 0}).json()['data']
+        self.assertEqual(data[0]['reviews'], [])
+
+    def test_reviews_endpoint_pages_and_summarises(self):
+        url = f'/api/product/{self.product.id}/reviews'
+        response = self.client.get(url, {'page_size': 4}).json()
+        self.assertEqual(response['summary']['histogram'], {'1': 1, '2': 1, '3': 0, '4': 2, '5': 3})
+
+        ids = [r['id'] for r in response['data']]
+        response = self.client.get(url, {'page_size': 4, 'cursor': response['next']}).json()
+        ids += [r['id'] for r in response['data']]
+
+        self.assertIsNone(response['next'])
+        self.assertEqual(ids, [r.id for r in self.reviews[::-1]])
+
+
+class ProductFilterIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ['Electronics', 'Home', 'Kitchen', 'Clothes']
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', brand=f'Brand {i % 7}', category=categories[i % 4], price=i % 500)
+            for i in range(2000)
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small tables make a sequential scan look cheapest; we only
+                # want to know that a usable index exists.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('ANALYZE')
+
+    def explain(self, params, ordering):
+        return ProductFilter(params, queryset=Product.objects.order_by(*ordering)).qs.explain()
+
+    def test_price_range_is_numeric(self):
+        qs = ProductFilter({'min_price': '9', 'max_price': '10.5'}, queryset=Product.objects.all()).qs
+        self.assertEqual(sorted({p.price for p in qs}), [9, 10])
+
+    def test_category_price_filter_uses_index(self):
+        plan = self.explain({'category': 'Home', 'min_price': 10, 'max_price': 50}, ['price', 'id'])
+        self.assertIn('product_category_price_idx', plan)
+
+    def test_brand_price_filter_uses_index(self):
+        plan = self.explain({'brand': 'Brand 3', 'max_price': 50}, ['price', 'id'])
+        self.assertIn('product_brand_price_idx', plan)
+
+    def test_category_newest_first_uses_index(self):
+        plan = self.explain({'category': 'Kitchen'}, ['-createdAt', '-id'])
+        self.assertIn('product_category_created_idx', plan)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Toaster', brand='Bajaj', category='Kitchen', price=25)
+        self.user = User.objects.create(username='carol@example.com')
+
+    def test_unchanged_listing_returns_304(self):
+        response = self.client.get('/api/products', {'category': 'Kitchen'})
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products', {'category': 'Kitchen'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_produce_new_etag(self):
+        etag = self.client.get('/api/products')['ETag']
+        self.assertNotEqual(etag, self.client.get('/api/products', {'page': 1})['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Oven', brand='Bajaj', category='Kitchen', price=90)
+            invalidate_product_cache()
+        response = self.client.get('/api/products', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_is_not_hidden_by_if_modified_since(self):
+        Product.objects.create(name='Oven', brand='Bajaj', category='Kitchen', price=90)
+        etag = self.client.get('/api/products')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+            invalidate_product_cache()
+
+        since = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.client.get('/api/products', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+        self.assertEqual(self.client.get('/api/products', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_reviews_etag_follows_review_writes(self):
+        url = f'/api/product/{self.product.id}/reviews'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/product/review/{self.product.id}', {'rating': 4, 'review': 'Ok'}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SparseFieldsetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(
+            name='Headphones', brand='Sony', category='Electronics', price=150, description='Noise cancelling.'
+        )
+        ProductImages.objects.create(product=self.product, image='products/front.jpg')
+        ProductImages.objects.create(product=self.product, image='products/back.jpg')
+
+    def test_fields_prune_columns_and_prefetches(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products', {'fields': 'name,price'}).json()
+
+        self.assertEqual(response['data'], [{'id': self.product.id, 'name': 'Headphones', 'price': '150.00'}])
+        # count + page, and the page query never reads description
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_thumbnail_loads_a_single_image(self):
+        response = self.client.get('/api/products', {'fields': 'name,thumbnail'}).json()
+        self.assertTrue(response['data'][0]['thumbnail'].endswith('products/front.jpg'))
+
+    def test_expand_adds_relations(self):
+        response = self.client.get('/api/products', {'fields': 'name', 'expand': 'images'}).json()
+        self.assertEqual(set(response['data'][0]), {'id', 'name', 'images'})
+        self.assertEqual(len(response['data'][0]['images']), 2)
+
+        response = self.client.get('/api/products', {'expand': 'reviews'}).json()
+        self.assertIn('description', response['data'][0])
+        self.assertNotIn('images', response['data'][0])
+
+    def test_cursor_ordering_column_is_loaded(self):
+        # page only; no deferred-field query per row for the cursor
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products', {'fields': 'name', 'pagination': 'cursor', 'ordering': 'price'})
+        self.assertTrue(response.json()['success'])
+
+
+class ProductFacetsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Product.objects.create(name='Laptop', brand='Dell', category='Electronics', price=60000)
+        Product.objects.create(name='Phone', brand='Samsung', category='Electronics', price=800)
+        Product.objects.create(name='Charger', brand='Samsung', category='Electronics', price=300)
+        Product.objects.create(name='Pan', brand='Prestige', category='Kitchen', price=700)
+
+    def facets(self, **params):
+        return self.client.get('/api/products/facets', params).json()['data']
+
+    def test_counts_every_dimension(self):
+        facets = self.facets()
+        self.assertEqual(facets['category'], [
+            {'value': 'Electronics', 'count': 3}, {'value': 'Kitchen', 'count': 1}
+        ])
+        self.assertEqual(facets['brand'][0], {'value': 'Samsung', 'count': 2})
+        self.assertEqual([b['count'] for b in facets['price']], [1, 2, 0, 0, 1])
+
+    def test_dimension_ignores_its_own_filter(self):
+        facets = self.facets(category='Kitchen', search='pan')
+        self.assertEqual(facets['category'], [{'value': 'Kitchen', 'count': 1}])
+        self.assertEqual(facets['brand'], [{'value': 'Prestige', 'count': 1}])
+
+        facets = self.facets(category='Kitchen')
+        self.assertEqual(len(facets['category']), 2)
+        self.assertEqual(facets['brand'], [{'value': 'Prestige', 'count': 1}])
+
+    def test_facets_are_cached_until_products_change(self):
+        self.facets(brand='Samsung')
+        with self.assertNumQueries(0):
+            self.facets(brand='Samsung', page=3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_product_cache()
+        with self.assertNumQueries(3):
+            self.facets(brand='Samsung')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductImageUploadTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        self.product = create_products(1)[0]
+        self.save = InMemoryStorage._save
+
+    def upload(self, count):
+        files = [SimpleUploadedFile(f'{i}.jpg', b'image-bytes', content_type='image/jpeg') for i in range(count)]
+        return self.client.post('/api/product/images', {'product': self.product.id, 'images': files})
+
+    def test_uploads_run_concurrently_and_insert_once(self):
+        # Every upload waits for the others, so this only finishes if they overlap.
+        barrier = threading.Barrier(4, timeout=5)
+
+        def save(storage, name, content):
+            barrier.wait()
+            return self.save(storage, name, content)
+
+        with mock.patch.object(InMemoryStorage, '_save', autospec=True, side_effect=save), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.upload(4).json()
+
+        self.assertTrue(response['success'])
+        self.assertEqual(len(response['data']), 4)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "product_productimages"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertTrue(all(default_storage.exists(image.image.name) for image in self.product.images.all()))
+
+    def test_partial_failure_rolls_back(self):
+        def save(storage, name, content):
+            if name.startswith('products/2'):
+                raise OSError('connection reset')
+            return self.save(storage, name, content)
+
+        with mock.patch.object(InMemoryStorage, '_save', autospec=True, side_effect=save):
+            response = self.upload(4).json()
+
+        self.assertFalse(response['success'])
+        self.assertFalse(ProductImages.objects.exists())
+        self.assertEqual(default_storage.listdir('products'), ([], []))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ImageVariantTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        self.product = create_products(1)[0]
+
+    def photo(self, name='photo.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), 'orange').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_generated_after_upload(self):
+        image = self.client.post('/api/product/images', {'product': self.product.id, 'images': [self.photo()]}).json()['data'][0]
+        self.assertEqual(image['variants_status'], 'Pending')
+        self.assertNotIn('variants_leased_until', image)
+        self.assertTrue(image['url'].endswith(image['image']))
+
+        call_command('generate_image_variants', stdout=StringIO())
+
+        stored = ProductImages.objects.get()
+        self.assertEqual(stored.variants_status, 'Ready')
+        with stored.thumbnail.open('rb') as file:
+            self.assertEqual(Image.open(file).size, (200, 150))
+        with stored.medium_webp.open('rb') as file:
+            self.assertEqual((Image.open(file).format, Image.open(file).size), ('WEBP', (800, 600)))
+
+        product = self.client.get('/api/products', {'image_size': 'medium', 'image_format': 'webp'}).json()['data'][0]
+        self.assertTrue(product['images'][0]['url'].endswith(stored.medium_webp.name))
+        self.assertTrue(product['thumbnail'].endswith(stored.thumbnail_webp.name))
+
+    def test_rendering_runs_outside_the_claim_transaction(self):
+        self.client.post('/api/product/images', {'product': self.product.id, 'images': [self.photo()]})
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def render(image):
+            seen.append((len(connection.atomic_blocks), ProductImages.objects.get(id=image.id).variants_leased_until))
+            # A second worker finds nothing to claim while the lease holds.
+            self.assertEqual(claim_pending_images(), [])
+            return {}
+
+        with mock.patch('product.variants.render_variants', side_effect=render):
+            self.assertEqual(process_pending_variants(), 1)
+
+        self.assertEqual(seen[0][0], depth)
+        self.assertIsNotNone(seen[0][1])
+        image = ProductImages.objects.get()
+        self.assertEqual((image.variants_status, image.variants_leased_until), ('Ready', None))
+
+    def test_expired_lease_is_claimed_again(self):
+        ProductImages.objects.create(product=self.product, image='products/a.jpg')
+        self.assertEqual(len(claim_pending_images()), 1)
+        self.assertEqual(claim_pending_images(), [])
+
+        ProductImages.objects.update(variants_leased_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(claim_pending_images()), 1)
+
+    def test_unreadable_image_is_marked_failed(self):
+        ProductImages.objects.create(product=self.product, image=SimpleUploadedFile('broken.jpg', b'not an image'))
+
+        call_command('generate_image_variants', stdout=StringIO())
+
+        image = ProductImages.objects.get()
+        self.assertEqual(image.variants_status, 'Failed')
+        self.assertEqual(variant_url(image, 'thumbnail'), image.image.url)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductDeletionCleanupTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='admin@example.com', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = create_products(1, user=self.user)[0]
+
+    def store(self, name):
+        return default_storage.save(name, ContentFile(b'image-bytes'))
+
+    def test_delete_queues_files_and_sweeper_removes_them(self):
+        names = []
+        for i in range(3):
+            image, thumbnail = self.store(f'products/{i}.jpg'), self.store(f'products/variants/{i}_thumbnail.jpg')
+            names += [image, thumbnail]
+            ProductImages.objects.create(product=self.product, image=image, thumbnail=thumbnail)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f'/api/product/delete/{self.product.id}').json()
+
+        self.assertTrue(response['success'])
+        # The set-based delete plus the product's (now empty) cascade, however many images.
+        deletes = [q for q in queries if q['sql'].startswith('DELETE FROM "product_productimages"')]
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(sorted(StorageDeletion.objects.values_list('key', flat=True)), sorted(names))
+
+        call_command('sweep_storage_deletions', stdout=StringIO())
+        self.assertFalse(StorageDeletion.objects.exists())
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_files_of_past_orders_are_kept(self):
+        image = self.store('products/ordered.jpg')
+        ProductImages.objects.create(product=self.product, image=image)
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, name='Ordered', price=10, image=image)
+
+        self.client.delete(f'/api/product/delete/{self.product.id}')
+        call_command('sweep_storage_deletions', stdout=StringIO())
+        self.assertTrue(default_storage.exists(image))
+
+        out = StringIO()
+        call_command('reconcile_image_storage', '--min-age-hours', '0', stdout=out)
+        self.assertNotIn(image, out.getvalue())
+
+    def test_sweeper_batches_s3_deletes(self):
+        StorageDeletion.objects.bulk_create([StorageDeletion(key=f'products/{i}.jpg') for i in range(2500)])
+        storage = mock.Mock(_normalize_name=lambda name: name)
+        storage.bucket.delete_objects.return_value = {'Errors': [{'Key': 'products/7.jpg', 'Message': 'Access Denied'}]}
+
+        with mock.patch('product.storage_cleanup.get_image_storage', return_value=storage):
+            self.assertEqual(sweep_deleted_files(), 2499)
+
+        sizes = [len(call.kwargs['Delete']['Objects']) for call in storage.bucket.delete_objects.call_args_list]
+        self.assertEqual(sizes, [1000, 1000, 500])
+        failed = StorageDeletion.objects.get()
+        self.assertEqual((failed.key, failed.attempts, failed.last_error), ('products/7.jpg', 1, 'Access Denied'))
+
+    def test_storage_is_called_outside_the_claim_transaction(self):
+        StorageDeletion.objects.bulk_create([StorageDeletion(key='products/a.jpg'), StorageDeletion(key='products/b.jpg')])
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def delete_objects(Delete, **kwargs):
+            seen.append((len(connection.atomic_blocks), StorageDeletion.objects.filter(leased_until__isnull=True).count()))
+            # A second sweeper finds nothing to claim while the lease holds.
+            self.assertEqual(claim_deletions(), [])
+            return {'Errors': [{'Key': 'products/b.jpg', 'Message': 'Slow Down'}]}
+
+        storage = mock.Mock(_normalize_name=lambda name: name)
+        storage.bucket.delete_objects.side_effect = delete_objects
+        with mock.patch('product.storage_cleanup.get_image_storage', return_value=storage):
+            self.assertEqual(sweep_deleted_files(), 1)
+
+        self.assertEqual(seen, [(depth, 0)])
+        failed = StorageDeletion.objects.get()
+        self.assertEqual((failed.key, failed.leased_until), ('products/b.jpg', None))
+
+    def test_reconcile_finds_orphans(self):
+        kept = self.store('reconcile/kept.jpg')
+        ProductImages.objects.create(product=self.product, image=kept)
+        orphan = self.store('reconcile/variants/orphan.webp')
+
+        out = StringIO()
+        call_command('reconcile_image_storage', '--prefix', 'reconcile', '--min-age-hours', '0', '--delete', stdout=out)
+
+        self.assertIn(orphan, out.getvalue())
+        self.assertEqual(list(StorageDeletion.objects.values_list('key', flat=True)), [orphan])
+
+        call_command('reconcile_image_storage', '--prefix', 'reconcile', '--min-age-hours', '0', stdout=out)
+        self.assertIn('Found 0 orphaned files.', out.getvalue())
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """
+    Just enough of S3 for direct uploads: browser-style POST uploads and
+    ListObjects on a single bucket.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        message = BytesParser(policy=email_policy).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + body
+        )
+        form = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True) for part in message.iter_parts()}
+        self.server.objects[form['key'].decode()] = form['file']
+        self.respond(204)
+
+    def do_GET(self):
+        prefix = parse_qs(urlparse(self.path).query).get('prefix', [''])[0]
+        contents = ''.join(
+            f'<Contents><Key>{escape(key)}</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified>'
+            f'<ETag>"etag"</ETag><Size>{len(data)}</Size><StorageClass>STANDARD</StorageClass></Contents>'
+            for key, data in sorted(self.server.objects.items()) if key.startswith(prefix)
+        )
+        self.respond(200, (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f'<Name>test-bucket</Name><Prefix>{escape(prefix)}</Prefix><Marker></Marker><MaxKeys>1000</MaxKeys>'
+            f'<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>'
+        ).encode())
+
+    def respond(self, code, body=b''):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeS3Storage(S3Storage):
+    # Configured on the class: with DEFAULT_FILE_STORAGE still set, Django 5.0
+    # drops the OPTIONS of an overridden default storage.
+    bucket_name = 'test-bucket'
+    endpoint_url = None
+    access_key = 'test'
+    secret_key = 'test'
+    region_name = 'us-east-1'
+    addressing_style = 'path'
+    querystring_auth = False
+
+
+class DirectUploadTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeS3Handler)
+        self.server.objects = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.enterContext(mock.patch.dict(os.environ, {'NO_PROXY': '127.0.0.1'}))
+        self.enterContext(mock.patch.object(FakeS3Storage, 'endpoint_url', f'http://127.0.0.1:{self.server.server_port}'))
+        self.enterContext(override_settings(STORAGES={**TEST_STORAGES, 'default': {'BACKEND': 'product.tests.FakeS3Storage'}}))
+
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin@example.com', is_staff=True))
+        self.product = create_products(1)[0]
+
+    def targets(self, content_types):
+        return self.client.post(f'/api/product/{self.product.id}/images/uploads', {'content_types': content_types}, format='json')
+
+    def confirm(self, keys):
+        return self.client.post(f'/api/product/{self.product.id}/images/confirm', {'keys': keys}, format='json').json()
+
+    def test_upload_then_confirm(self):
+        targets = self.targets(['image/jpeg', 'image/png']).json()['data']
+        self.assertEqual(self.server.objects, {})
+
+        for target in targets:
+            self.assertTrue(target['key'].startswith(f'products/uploads/{self.product.id}/'))
+            response = requests.post(target['url'], data=target['fields'], files={'file': ('photo', b'image-bytes')})
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(set(self.server.objects), {target['key'] for target in targets})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.confirm([target['key'] for target in targets])
+
+        self.assertTrue(response['success'])
+        self.assertEqual(len(response['data']), 2)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "product_productimages"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(set(self.product.images.values_list('variants_status', flat=True)), {'Pending'})
+
+    def test_confirm_rejects_foreign_missing_and_duplicate_keys(self):
+        key = self.targets(['image/webp']).json()['data'][0]['key']
+        self.server.objects[key] = b'image-bytes'
+        self.confirm([key])
+
+        missing = f'products/uploads/{self.product.id}/missing.jpg'
+        response = self.confirm([key, missing, 'products/uploads/999/other.jpg'])
+
+        self.assertFalse(response['success'])
+        self.assertEqual(response['data'], [])
+        self.assertEqual(set(response['rejected']), {key, missing, 'products/uploads/999/other.jpg'})
+        self.assertEqual(self.product.images.count(), 1)
+
+    def test_rejects_unsupported_types(self):
+        self.assertEqual(self.targets(['application/pdf']).status_code, 400)
+        self.assertEqual(self.targets([]).status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ImageURLCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_image_urls('STORAGES')
+        self.client = APIClient()
+        for product in create_products(3):
+            ProductImages.objects.bulk_create([
+                ProductImages(product=product, image=f'products/{product.id}-{i}.jpg') for i in range(4)
+            ])
+
+    def list_products(self):
+        cache.clear()
+        return self.client.get('/api/products').json()['data']
+
+    def test_listing_signs_each_key_once(self):
+        with mock.patch.object(InMemoryStorage, 'url', autospec=True, side_effect=lambda storage, name: f'/signed/{name}') as url:
+            first = self.list_products()
+            calls = url.call_count
+            second = self.list_products()
+
+        self.assertEqual(calls, 12)
+        self.assertEqual(url.call_count, 12)
+        self.assertEqual(first, second)
+        self.assertTrue(first[0]['images'][0]['image'].startswith('/signed/products/'))
+
+    def test_signed_urls_expire_before_their_signature(self):
+        storage = mock.Mock(querystring_auth=True, querystring_expire=3600)
+        storage.url.side_effect = ['signed-1', 'signed-2']
+        self.assertEqual(url_lifetime(storage), 1800)
+
+        with mock.patch('product.image_urls.get_image_storage', return_value=storage), \
+                mock.patch('product.image_urls.time.monotonic', side_effect=[0, 1799, 1800]):
+            self.assertEqual([image_url('products/a.jpg') for _ in range(3)], ['signed-1', 'signed-1', 'signed-2'])
+
+    @override_settings(IMAGE_URL_BASE='https://cdn.example.com/')
+    def test_public_base_skips_signing(self):
+        with mock.patch.object(InMemoryStorage, 'url', autospec=True) as url:
+            product = self.list_products()[0]
+
+        url.assert_not_called()
+        self.assertEqual(product['thumbnail'], f'https://cdn.example.com/products/{product["id"]}-0.jpg')
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+
+from .models import ProductImages
+
+
+UPLOAD_WORKERS = 8
+
+
+class UploadFailed(Exception):
+    pass
+
+
+def _delete_quietly(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def upload_product_images(product, files, workers=UPLOAD_WORKERS):
+    """
+    Upload `files` to the image storage concurrently, then register them with
+    one bulk_create. If any upload or the insert fails, the objects already
+    stored are deleted and nothing is written to the database.
+    """
+    if not files:
+        return []
+
+    field = ProductImages._meta.get_field('image')
+    storage = field.storage
+
+    def save(file):
+        return storage.save(field.generate_filename(None, file.name), file)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        futures = [pool.submit(save, file) for file in files]
+
+    names = [f.result() for f in futures if not f.exception()]
+    errors = [f.exception() for f in futures if f.exception()]
+    if errors:
+        _delete_quietly(storage, names)
+        raise UploadFailed(f'{len(errors)} of {len(files)} uploads failed: {errors[0]}')
+
+    try:
+        with transaction.atomic():
+            return ProductImages.objects.bulk_create([ProductImages(product=product, image=name) for name in names])
+    except Exception:
+        _delete_quietly(storage, names)
+        raise
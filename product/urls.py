@@ -3,8 +3,12 @@ from .views import *
 
 urlpatterns = [
     path('products', ProductsView.as_view()),
+    path('products/facets', ProductFacetsView.as_view()),
+    path('product/<int:pk>/reviews', ProductReviewsView.as_view()),
     path('product/upload', UploadProductView.as_view()),
     path('product/images', UploadProductImage.as_view()),
+    path('product/<int:pk>/images/uploads', DirectUploadTargetsView.as_view()),
+    path('product/<int:pk>/images/confirm', ConfirmDirectUploadsView.as_view()),
     path('product/update/<int:pk>', UpdateProductView.as_view()),
     path('product/delete/<int:pk>', DeleteProductView.as_view()),
     path('product/review/<int:pk>', ReviewProduct.as_view()),
@@ -0,0 +1,119 @@
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_product_cache
+from .image_urls import image_url
+from .models import Product, ProductImages, VariantStatus
+
+
+VARIANT_SIZES = {'thumbnail': 200, 'medium': 800}
+IMAGE_SIZES = [*VARIANT_SIZES, 'original']
+IMAGE_FORMATS = ['webp']
+VARIANT_BATCH_SIZE = 20
+VARIANT_LEASE = timedelta(minutes=10)
+
+VARIANT_ENCODINGS = [
+    ('', 'JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    ('_webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+]
+
+
+def variant_url(image, size, image_format=None):
+    """
+    URL of `image` at `size`, in WebP when `image_format` asks for it. Falls
+    back to the original until the variants have been generated.
+    """
+    if size in VARIANT_SIZES and image.variants_status == VariantStatus.READY:
+        variant = getattr(image, f'{size}_webp' if image_format == 'webp' else size)
+        if variant:
+            return image_url(variant.name)
+    return image_url(image.image.name)
+
+
+def render_variants(image):
+    """
+    Store every size/encoding of `image` and return the field values to
+    record, e.g. {'thumbnail': ..., 'thumbnail_webp': ...}.
+    """
+    field = ProductImages._meta.get_field('thumbnail')
+    storage = field.storage
+    base = os.path.splitext(os.path.basename(image.image.name))[0]
+
+    with image.image.open('rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file)).convert('RGB')
+
+    names = {}
+    try:
+        for size_name, size in VARIANT_SIZES.items():
+            variant = original.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            for suffix, image_format, extension, options in VARIANT_ENCODINGS:
+                buffer = BytesIO()
+                variant.save(buffer, image_format, **options)
+                name = field.generate_filename(None, f'{base}_{size_name}.{extension}')
+                names[size_name + suffix] = storage.save(name, ContentFile(buffer.getvalue()))
+    except Exception:
+        for name in names.values():
+            storage.delete(name)
+        raise
+
+    return names
+
+
+def claim_pending_images(batch_size=VARIANT_BATCH_SIZE):
+    # SKIP LOCKED keeps workers off each other's rows during the claim, and
+    # the lease keeps them off while the variants are rendered outside the
+    # transaction. A crashed worker's images become claimable again after it.
+    now = timezone.now()
+    with transaction.atomic():
+        images = list(
+            ProductImages.objects.select_for_update(skip_locked=True)
+            .filter(variants_status=VariantStatus.PENDING)
+            .filter(Q(variants_leased_until__isnull=True) | Q(variants_leased_until__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        ProductImages.objects.filter(id__in=[image.id for image in images]).update(
+            variants_leased_until=now + VARIANT_LEASE
+        )
+    return images
+
+
+def process_pending_variants(batch_size=VARIANT_BATCH_SIZE):
+    """
+    Generate variants for up to `batch_size` pending images. Images are
+    claimed with a lease, rendered with no transaction open and recorded with
+    one short UPDATE each. Returns the number of images handled.
+    """
+    images = claim_pending_images(batch_size)
+    product_ids = set()
+
+    for image in images:
+        pending = ProductImages.objects.filter(id=image.id, variants_status=VariantStatus.PENDING)
+        try:
+            names = render_variants(image)
+        except Exception:
+            pending.update(variants_status=VariantStatus.FAILED, variants_leased_until=None)
+            continue
+
+        if pending.update(variants_status=VariantStatus.READY, variants_leased_until=None, **names):
+            product_ids.add(image.product_id)
+        else:
+            # The image was deleted, or another worker finished it after this
+            # lease ran out; drop the duplicate files.
+            storage = ProductImages._meta.get_field('thumbnail').storage
+            for name in names.values():
+                storage.delete(name)
+
+    if product_ids:
+        # Listings embed image URLs, so a new variant is a product change.
+        Product.objects.filter(id__in=product_ids).update(updatedAt=timezone.now())
+        invalidate_product_cache()
+
+    return len(images)
@@ -1,39 +1,231 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from django.db.models import Q
-from django.db.models import Avg
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+from django.db.models.functions import Ceil
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from .models import Product, ProductImages, ProductReview
 from .serializers import ProductSerializer, ProductImagesSerializer, ProductReviewSerializer
-from .filters import ProductFilter
+from .serializers import EMBEDDED_REVIEWS, MAX_EMBEDDED_REVIEWS
+from .filters import filter_products
+from .ratings import update_rating_aggregates
+from .uploads import upload_product_images
+from .variants import IMAGE_FORMATS, IMAGE_SIZES
+from .storage_cleanup import delete_images
+from .direct_uploads import (
+    DIRECT_UPLOAD_EXPIRY, MAX_DIRECT_UPLOADS, DirectUploadError, confirm_uploads, create_upload_targets
+)
+from .cache import PRODUCTS_CACHE_NAMESPACE, PRODUCTS_CACHE_TIMEOUT, invalidate_product_cache
+from utils.cache import make_key, params_digest, get_or_build
+from utils.conditional import make_validators, not_modified, set_validators
+from utils.pagination import CursorPaginator, InvalidCursor
+from utils.helpers import get_bounded_int, get_choice_param, get_list_param
+
+
+PRODUCTS_PER_PAGE = 5
+CURSOR_ORDERINGS = ['id', '-id', 'price', '-price', 'createdAt', '-createdAt']
+FACET_PARAMS = ['search', 'keyword', 'category', 'brand', 'min_price', 'max_price']
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 5000), (5000, 10000), (10000, None)]
+MAX_BRAND_FACETS = 50
+REVIEWS_PER_PAGE = 10
+MAX_REVIEWS_PER_PAGE = 50
 
 
 class ProductsView(APIView):
     def get(self, request):
         try:
-            products = Product.objects.all()
-            search_query = request.GET.get('search')
-            
-            if search_query:
-                products = Product.objects.filter(Q(name__icontains=search_query))
+            if request.GET.get('ordering', 'id') not in CURSOR_ORDERINGS:
+                return Response({
+                    'success': False,
+                    'message': 'Error occured.',
+                    'error': f"Invalid ordering. Choose from {', '.join(CURSOR_ORDERINGS)}."
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # The key holds the catalog generation, which every product write
+            # bumps, and the parameters, so it validates the response without
+            # a query. ETag only: there is no modification time to offer.
+            key = make_key(PRODUCTS_CACHE_NAMESPACE, request.GET)
+            etag, _ = make_validators(None, key)
+
+            response = not_modified(request, etag, None)
+            if response is not None:
+                return response
+
+            data = get_or_build(key, lambda: self.get_page(request), PRODUCTS_CACHE_TIMEOUT)
+
+            return set_validators(Response(data), etag, None)
+
+        except InvalidCursor as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            })
 
-            filterset = ProductFilter(request.GET, queryset=products.order_by('id'))
-            page_number = request.GET.get('page', 1)
-            paginator = Paginator(filterset.qs, 5)
-            serializer = ProductSerializer(paginator.page(page_number), many=True)
+    def get_queryset(self, request):
+        return filter_products(request.GET)
+
+    def get_page(self, request):
+        review_limit = get_bounded_int(request.GET, 'reviews', EMBEDDED_REVIEWS, MAX_EMBEDDED_REVIEWS)
+        fields = ProductSerializer.get_requested_fields(
+            get_list_param(request.GET, 'fields'),
+            get_list_param(request.GET, 'expand')
+        )
+        context = {
+            'review_limit': review_limit,
+            'fields': fields,
+            'image_size': get_choice_param(request.GET, 'image_size', IMAGE_SIZES, 'original'),
+            'image_format': get_choice_param(request.GET, 'image_format', IMAGE_FORMATS, None)
+        }
+
+        ordering = request.GET.get('ordering', 'id')
+        products = ProductSerializer.setup_eager_loading(
+            self.get_queryset(request), fields, review_limit, ordering=[ordering]
+        )
+
+        if request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET:
+            return self.get_cursor_page(request, products, context)
+
+        # Search results keep their rank order unless an ordering is asked for.
+        if 'ordering' in request.GET:
+            products = products.order_by(*dict.fromkeys([ordering, 'id']))
+
+        page_number = request.GET.get('page', 1)
+        paginator = Paginator(products, PRODUCTS_PER_PAGE)
+        serializer = ProductSerializer(paginator.page(page_number), many=True, context=context)
+
+        return {
+            'success': True,
+            'message': 'Products fetched successfully.',
+            'data': serializer.data
+        }
+
+    def get_cursor_page(self, request, queryset, context):
+        ordering = request.GET.get('ordering', 'id')
+        paginator = CursorPaginator(queryset, [ordering], PRODUCTS_PER_PAGE)
+        page = paginator.page(request.GET.get('cursor'))
+        serializer = ProductSerializer(page, many=True, context=context)
+
+        response = {
+            'success': True,
+            'message': 'Products fetched successfully.',
+            'next': page.next_cursor,
+            'previous': page.prev_cursor,
+            'data': serializer.data
+        }
+        if request.GET.get('count') == 'true':
+            response['count'] = paginator.count()
+
+        return response
+
+
+class ProductFacetsView(APIView):
+    def get(self, request):
+        try:
+            params = { name: request.GET[name] for name in FACET_PARAMS if request.GET.get(name) }
+            key = make_key(PRODUCTS_CACHE_NAMESPACE, params) + ':facets'
+            facets = get_or_build(key, lambda: self.get_facets(request.GET), PRODUCTS_CACHE_TIMEOUT)
 
             return Response({
                 'success': True,
-                'message': 'Products fetched successfully.',
-                'data': serializer.data
+                'message': 'Facets fetched successfully.',
+                'data': facets
             })
-        
+
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            })
+
+    def get_facets(self, params):
+        # Each dimension is counted with every filter except its own, so the
+        # sidebar still shows the alternatives to the current selection.
+        categories = filter_products(params, exclude=['category']).values('category').annotate(count=Count('id'))
+        brands = filter_products(params, exclude=['brand']).values('brand').annotate(count=Count('id'))
+
+        bucket = Case(
+            *[When(price__gte=low, price__lt=high, then=Value(i)) for i, (low, high) in enumerate(PRICE_BUCKETS[:-1])],
+            default=Value(len(PRICE_BUCKETS) - 1)
+        )
+        prices = filter_products(params, exclude=['min_price', 'max_price']).annotate(bucket=bucket)
+        price_counts = { row['bucket']: row['count'] for row in prices.values('bucket').annotate(count=Count('id')).order_by() }
+
+        return {
+            'category': [
+                { 'value': row['category'], 'count': row['count'] }
+                for row in categories.order_by('-count', 'category')
+            ],
+            'brand': [
+                { 'value': row['brand'], 'count': row['count'] }
+                for row in brands.order_by('-count', 'brand')[:MAX_BRAND_FACETS]
+            ],
+            'price': [
+                { 'min': low, 'max': high, 'count': price_counts.get(i, 0) }
+                for i, (low, high) in enumerate(PRICE_BUCKETS)
+            ]
+        }
+
+
+class ProductReviewsView(APIView):
+    def get(self, request, pk):
+        try:
+            product = get_object_or_404(Product, id=pk)
+
+            # Review writes bump the product's updatedAt and review_count.
+            etag, last_modified = make_validators(product.updatedAt, product.review_count, params_digest(request.GET))
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            page_size = get_bounded_int(request.GET, 'page_size', REVIEWS_PER_PAGE, MAX_REVIEWS_PER_PAGE, minimum=1)
+
+            paginator = CursorPaginator(product.reviews.all(), ['-createdAt', '-id'], page_size)
+            page = paginator.page(request.GET.get('cursor'))
+            serializer = ProductReviewSerializer(page, many=True)
+
+            histogram = { star: 0 for star in range(1, 6) }
+            buckets = product.reviews.order_by().values(star=Ceil('rating')).annotate(count=Count('id'))
+            for bucket in buckets:
+                histogram[int(bucket['star'])] = bucket['count']
+
+            return set_validators(Response({
+                'success': True,
+                'message': 'Reviews fetched successfully.',
+                'summary': {
+                    'count': product.review_count,
+                    'average': product.ratings,
+                    'histogram': histogram
+                },
+                'next': page.next_cursor,
+                'previous': page.prev_cursor,
+                'data': serializer.data
+            }), etag, last_modified)
+
+        except InvalidCursor as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         except Exception as ex:
             return Response({
                 'success': False,
@@ -54,6 +246,7 @@ class UploadProductView(APIView):
 
             if serializer.is_valid():
                 serializer.save()
+                invalidate_product_cache()
                 return Response({
                     'success': True,
                     'message': 'Product uploaded successfully.',
@@ -83,12 +276,13 @@ class UploadProductImage(APIView):
         try:
             data = request.data
             files = request.FILES.getlist('images')
+            product = get_object_or_404(Product.objects.only('id'), id=data['product'])
 
-            images = []
-            for file in files:
-                image = ProductImages.objects.create(product=Product(data['product']), image=file)
-                images.append(image)
+            images = upload_product_images(product, files)
 
+            # Images are part of the listing, so they count as a product change.
+            Product.objects.filter(id=product.id).update(updatedAt=timezone.now())
+            invalidate_product_cache()
             serializer = ProductImagesSerializer(images, many=True)
 
             return Response({
@@ -105,6 +299,83 @@ class UploadProductImage(APIView):
             })
         
 
+class DirectUploadTargetsView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request, pk):
+        product = get_object_or_404(Product.objects.only('id'), id=pk)
+        content_types = request.data.get('content_types')
+
+        try:
+            if not isinstance(content_types, list):
+                raise DirectUploadError('content_types must be a list.')
+            targets = create_upload_targets(product.id, content_types)
+
+            return Response({
+                'success': True,
+                'message': 'Upload targets created successfully.',
+                'expires_in': DIRECT_UPLOAD_EXPIRY,
+                'data': targets
+            })
+
+        except DirectUploadError as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            })
+
+
+class ConfirmDirectUploadsView(APIView):
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request, pk):
+        product = get_object_or_404(Product.objects.only('id'), id=pk)
+        keys = request.data.get('keys')
+
+        try:
+            if not isinstance(keys, list) or not keys or len(keys) > MAX_DIRECT_UPLOADS:
+                raise DirectUploadError(f'keys must be a list of 1 to {MAX_DIRECT_UPLOADS} upload keys.')
+            images, rejected = confirm_uploads(product, keys)
+
+            if images:
+                Product.objects.filter(id=product.id).update(updatedAt=timezone.now())
+                invalidate_product_cache()
+            serializer = ProductImagesSerializer(images, many=True)
+
+            return Response({
+                'success': not rejected,
+                'message': f'{len(images)} images registered.',
+                'data': serializer.data,
+                'rejected': rejected
+            })
+
+        except DirectUploadError as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as ex:
+            return Response({
+                'success': False,
+                'message': 'Error occured.',
+                'error': str(ex)
+            })
+
+
 class UpdateProductView(APIView):
 
     authentication_classes = [JWTAuthentication]
@@ -124,6 +395,7 @@ class UpdateProductView(APIView):
             serializer = ProductSerializer(data=request.data, instance=product, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                invalidate_product_cache()
                 return Response({
                     'success': True,
                     'message': 'Product updated successfully.',
@@ -158,12 +430,10 @@ class DeleteProductView(APIView):
                     'message': 'You are not authorized for this.'
                 }, status=status.HTTP_401_UNAUTHORIZED)
 
-            args = { 'product': pk }
-            images = ProductImages.objects.filter(**args)
-            for i in images:
-                i.delete()
-
-            product.delete()
+            with transaction.atomic():
+                delete_images(ProductImages.objects.filter(product=pk))
+                product.delete()
+            invalidate_product_cache()
 
             return Response({
                 'success': True,
@@ -187,49 +457,54 @@ class ReviewProduct(APIView):
         try:
             data = request.data
 
-            if data['rating'] <= 0 or data['rating'] > 5:
+            # Round to the column's precision first so the aggregate deltas
+            # match what the review row stores.
+            try:
+                rating = Decimal(str(data['rating'])).quantize(Decimal('0.1'))
+            except InvalidOperation:
+                rating = None
+            if rating is None or not rating.is_finite():
+                return Response({
+                    'success': False,
+                    'error': 'Rating must be a number.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if rating <= 0 or rating > 5:
                 return Response({
                     'success': False,
                     'error': 'Please rate from 1 to 5.'
                 }, status=status.HTTP_406_NOT_ACCEPTABLE)
 
             product = get_object_or_404(Product, id=pk)
-            review = product.reviews.filter(user=request.user) 
 
-            obj = get_object_or_404(ProductReview, user=request.user.id)
-            if obj.user != request.user:
-                return Response({
-                    'success': False,
-                    'message': 'You are not authorized for this.'
-                }, status=status.HTTP_401_UNAUTHORIZED)
+            with transaction.atomic():
+                review = product.reviews.select_for_update().filter(user=request.user).first()
 
-            if review.exists():
-                new_review = { 'review':data['review'], 'rating': data['rating'] } 
-                review.update(**new_review)
+                if review is not None:
+                    old_rating = review.rating
+                    review.review = data['review']
+                    review.rating = rating
+                    review.save()
 
-                rating = product.reviews.aggregate(avg_ratings=Avg('rating'))
-                product.rating = rating['avg_ratings']
-                product.save()
+                    update_rating_aggregates(product.id, 0, rating - old_rating)
+                    message = 'Review updated successfully.'
 
-                return Response({
-                    'success': True,
-                    'message': 'Review updated successfully.',
-                    'data': data
-                })
+                else:
+                    ProductReview.objects.create(
+                        user = request.user,
+                        product = product,
+                        review = data['review'],
+                        rating = rating
+                    )
+
+                    update_rating_aggregates(product.id, 1, rating)
+                    message = 'Review posted successfully.'
 
-            ProductReview.objects.create(
-                user = request.user,
-                product = product,
-                review = data['review'],
-                rating = data['rating']
-            )
-            rating = product.reviews.aggregate(avg_ratings=Avg('rating'))
-            product.rating = rating['avg_ratings']
-            product.save()
+                invalidate_product_cache()
 
             return Response({
                 'success': True,
-                'message': 'Review posted successfully.',
+                'message': message,
                 'data': data
             })
             
@@ -249,25 +524,19 @@ class DeleteReview(APIView):
     def delete(self, request, pk):
         try:
             product = get_object_or_404(Product, id=pk)
-            review = product.reviews.filter(user=request.user)
-            print(review)
 
-            if review.exists():
-            
-                review.delete()
-
-                rating = product.reviews.aggregate(avg_ratings=Avg('rating'))
+            with transaction.atomic():
+                reviews = list(product.reviews.select_for_update().filter(user=request.user))
 
-                if rating['avg_ratings'] is None:
-                    product.rating = 0
+                if reviews:
+                    ProductReview.objects.filter(id__in=[r.id for r in reviews]).delete()
+                    update_rating_aggregates(product.id, -len(reviews), -sum(r.rating for r in reviews))
+                    invalidate_product_cache()
 
-                product.rating = rating['avg_ratings']
-                product.save()
-
-                return Response({
-                    'success': True,
-                    'message': 'Review deleted successfully.'
-                })
+                    return Response({
+                        'success': True,
+                        'message': 'Review deleted successfully.'
+                    })
             
             return Response({
                 'success': False,
@@ -279,4 +548,4 @@ class DeleteReview(APIView):
                 'success': False,
                 'message': 'Something went wrong.',
                 'error': str(ex)
-            })
\ No newline at end of file
+            })
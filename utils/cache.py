@@ -0,0 +1,88 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_generation(namespace):
+    key = f'{namespace}:generation'
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so a lost generation key can never resurrect
+        # entries written under an older generation with the same number.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(namespace):
+    key = f'{namespace}:generation'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def params_digest(params):
+    """
+    Hash `params` (a QueryDict or dict) so that parameter order and blank
+    values do not matter.
+    """
+    if hasattr(params, 'lists'):
+        items = params.lists()
+    else:
+        items = ((k, v if isinstance(v, (list, tuple)) else [v]) for k, v in params.items())
+
+    normalized = sorted(
+        (key, sorted(str(v) for v in values if v not in ('', None)))
+        for key, values in items
+    )
+    normalized = [(key, values) for key, values in normalized if values]
+    return hashlib.sha1(repr(normalized).encode()).hexdigest()
+
+
+def make_key(namespace, params):
+    # Keys embed the namespace generation, so bumping it orphans them all.
+    return f'{namespace}:{get_generation(namespace)}:{params_digest(params)}'
+
+
+def get_or_build(key, builder, timeout):
+    """
+    Return the cached value for `key`, calling `builder()` to rebuild it when
+    missing or expired. Only one caller rebuilds a key at a time: while the
+    lock is held, others serve the stale copy if there is one, or wait briefly
+    for the rebuilt value.
+    """
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return entry[1]
+
+        deadline = now + LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+
+    try:
+        value = builder()
+        # Keep the entry past its soft expiry so it can be served stale
+        # while a single worker rebuilds it.
+        cache.set(key, (time.time() + timeout, value), timeout=timeout * 2)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
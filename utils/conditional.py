@@ -0,0 +1,38 @@
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return int(value.timestamp())
+
+
+def make_validators(last_modified, *parts):
+    """
+    Return an (etag, last_modified) pair for a response whose content is fully
+    determined by `last_modified` and `parts` (row counts, query parameters).
+    """
+    # The ETag keeps sub-second precision; Last-Modified cannot.
+    payload = ':'.join(str(part) for part in (last_modified, *parts))
+    etag = '"%s"' % hashlib.sha1(payload.encode()).hexdigest()
+    return etag, _timestamp(last_modified)
+
+
+def not_modified(request, etag, last_modified):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -2,4 +2,23 @@ def get_current_host(request):
     protocol = request.is_secure() and 'http' or 'https'
     host = request.get_host()
     #return f"{protocol}://{host}/"
-    return f"http://{host}/"
\ No newline at end of file
+    return f"http://{host}/"
+
+def get_bounded_int(params, name, default, maximum, minimum=0):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, min(value, maximum))
+
+
+def get_list_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def get_choice_param(params, name, choices, default):
+    value = params.get(name)
+    return value if value in choices else default
@@ -0,0 +1,112 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor.')
+
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor.')
+    return values, direction
+
+
+def _keyset_filter(ordering, values, forward):
+    # Builds (a > x) OR (a = x AND b > y) OR ... for the given ordering.
+    # `ordering` always ends with a unique field so the position is exact.
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over an ordered queryset.
+
+    Every page is fetched with a `WHERE (ordering) > (cursor)` condition and a
+    LIMIT, so page 10,000 costs the same as page 1 as long as the ordering is
+    backed by an index. The total count is only computed when asked for.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering = list(ordering) + ['id']
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.page_size = page_size
+
+    def _position(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value if isinstance(value, (int, str)) else str(value))
+        return values
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        direction = 'next'
+
+        if cursor:
+            values, direction = decode_cursor(cursor)
+            if len(values) != len(self.ordering):
+                raise InvalidCursor('Invalid cursor.')
+            queryset = queryset.filter(_keyset_filter(self.ordering, values, direction == 'next'))
+
+        ordering = self.ordering if direction == 'next' else [_flip(f) for f in self.ordering]
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == 'prev':
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if direction == 'prev' or has_more:
+                next_cursor = encode_cursor(self._position(rows[-1]), 'next')
+            if (direction == 'next' and cursor) or (direction == 'prev' and has_more):
+                prev_cursor = encode_cursor(self._position(rows[0]), 'prev')
+
+        return CursorPage(rows, next_cursor, prev_cursor)
+
+    def count(self):
+        return self.queryset.count()
+
+
+class CursorPage:
+
+    def __init__(self, object_list, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)